@@ -258,6 +258,7 @@ def create_app(testing=False, database_uri=None):
         app.cli.add_command(create_new_unit)
         app.cli.add_command(update_uploaded_file_with_log)
         app.cli.add_command(lost_files_s3_db)
+        app.cli.add_command(update_project_totals)
 
         with app.app_context():  # Everything in here has access to sessions
             from dds_web.database import models
@@ -339,6 +340,14 @@ def fill_db_wrapper(db_type):
 
             dds_web.development.factories.create_all()
 
+        from dds_web.api import db_tools
+        from dds_web.database import models
+
+        for project in models.Project.query:
+            db_tools.rebuild_folder_tree(project=project)
+            db_tools.recompute_project_totals(project=project)
+        db.session.commit()
+
         flask.current_app.logger.info("DB filled")
 
 
@@ -393,157 +402,363 @@ def create_new_unit(
 @click.command("update-uploaded-file")
 @click.option("--project", "-p", type=str, required=True)
 @click.option("--path-to-log-file", "-fp", type=str, required=True)
+@click.option("--workers", "-w", type=int, required=False, default=16)
 @flask.cli.with_appcontext
-def update_uploaded_file_with_log(project, path_to_log_file):
+def update_uploaded_file_with_log(project, path_to_log_file, workers):
     """Update file details that weren't properly uploaded to db from cli log"""
     import botocore
+    import concurrent.futures
+    import time
     from dds_web.database import models
-    from dds_web import db
+    from dds_web import db, utils
+    from dds_web.api import db_tools
     from dds_web.api.api_s3_connector import ApiS3Connector
     import json
 
+    batch_size = 1000
+
     proj_in_db = models.Project.query.filter_by(public_id=project).one_or_none()
     assert proj_in_db
 
     with open(path_to_log_file, "r") as f:
         log = json.load(f)
+    failed = {
+        file: vals
+        for file, vals in log.items()
+        if vals.get("status") and vals["status"].get("failed_op") == "add_file_db"
+    }
+    flask.current_app.logger.info(f"Files to add: {len(failed)}")
+
+    # Check which files are already in the database with a single query
     errors = {}
+    with db_tools.temporary_table(
+        "tmp_uploaded_files",
+        sqlalchemy.Column("name_sha256", sqlalchemy.BINARY(32), nullable=False),
+        sqlalchemy.Index("ix_tmp_uploaded_files_name_sha256", "name_sha256"),
+        rows=({"name_sha256": utils.sha256_digest(x)} for x in failed),
+    ) as names_table:
+        for file in db.session.execute(
+            sqlalchemy.select(models.File.name)
+            .join(names_table, names_table.c.name_sha256 == models.File.name_sha256)
+            .where(models.File.project_id == sqlalchemy.func.binary(proj_in_db.id))
+        ).scalars():
+            errors[file] = {"error": "File already in database."}
+
+    # Check that the other files are in the bucket, in parallel with the same client
+    to_check = [x for x in failed if x not in errors]
+    in_s3 = []
+    with ApiS3Connector(project=proj_in_db) as s3conn:
+        client = s3conn.resource.meta.client
+
+        def head_object(file):
+            return client.head_object(Bucket=proj_in_db.bucket, Key=failed[file]["path_remote"])
+
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(head_object, x): x for x in to_check}
+            for num_done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+                file = futures[future]
+                try:
+                    future.result()
+                except botocore.client.ClientError as err:
+                    if err.response["Error"]["Code"] == "404":
+                        errors[file] = {
+                            "error": "File not found in S3",
+                            "traceback": err.__traceback__,
+                        }
+                    else:
+                        errors[file] = {"error": str(err)}
+                else:
+                    in_s3.append(file)
+
+                if num_done % batch_size == 0 or num_done == len(futures):
+                    elapsed = time.perf_counter() - start
+                    flask.current_app.logger.info(
+                        f"Checked {num_done}/{len(futures)} files in S3 "
+                        f"({num_done / elapsed:.0f} files/s)"
+                    )
+
+    # Add the files and their versions in batches
     files_added = []
-    for file, vals in log.items():
-        status = vals.get("status")
-        if not status or not status.get("failed_op") == "add_file_db":
-            continue
+    start = time.perf_counter()
+    for i in range(0, len(in_s3), batch_size):
+        batch = in_s3[i : i + batch_size]
+        db_tools.insert_files(
+            project=proj_in_db,
+            files=[
+                {
+                    "name": x,
+                    "name_in_bucket": failed[x]["path_remote"],
+                    "subpath": failed[x]["subpath"],
+                    "size": failed[x]["size_raw"],
+                    "size_processed": failed[x]["size_processed"],
+                    "compressed": not failed[x]["compressed"],
+                    "public_key": failed[x]["public_key"],
+                    "salt": failed[x]["salt"],
+                    "checksum": failed[x]["checksum"],
+                }
+                for x in batch
+            ],
+            batch_size=batch_size,
+        )
+        db.session.commit()
+        files_added.extend(batch)
+
+        elapsed = time.perf_counter() - start
+        flask.current_app.logger.info(
+            f"Added {len(files_added)}/{len(in_s3)} files to the database "
+            f"({len(files_added) / elapsed:.0f} files/s)"
+        )
+
+    flask.current_app.logger.info(f"Files added: {files_added}")
+    flask.current_app.logger.info(f"Errors while adding files: {errors}")
+
+
+def reconcile_project_files(
+    app,
+    unit_name: str,
+    credentials: dict,
+    project_id: int,
+    action_type: str,
+    full: bool = False,
+    batch_size=1000,
+):
+    """Find (and optionally delete) the files of a project present in S3 or in the db, not both.
+
+    Run in a worker thread with its own app context, database session and S3 resource. The
+    bucket listing and the file names ordered by their bytes (the S3 listing order) are
+    compared in a single pass. Only the lost files are kept in memory.
+
+    Unless full, the project is skipped if its files and bucket statistics are the same as when
+    it last had no lost files.
+
+    Returns the number of lost files in the db and in S3 and if the project was skipped, None
+    if the bucket is missing.
+    """
+    import botocore
+
+    from dds_web import utils
+    from dds_web.api import db_tools
+    from dds_web.api import s3_cache
+    from dds_web.api.api_s3_connector import ApiS3Connector
+    from dds_web.database import models
+
+    with app.app_context():
+        try:
+            project = models.Project.query.get(project_id)
+            client = s3_cache.get_resource(**credentials).meta.client
 
-        with ApiS3Connector(project=proj_in_db) as s3conn:
             try:
-                _ = s3conn.resource.meta.client.head_object(
-                    Bucket=s3conn.project.bucket, Key=vals["path_remote"]
+                state = db_tools.lost_files_state(
+                    project=project,
+                    s3_statistics=ApiS3Connector.bucket_statistics(
+                        client=client, bucket=project.bucket
+                    ),
                 )
             except botocore.client.ClientError as err:
-                if err.response["Error"]["Code"] == "404":
-                    errors[file] = {"error": "File not found in S3", "traceback": err.__traceback__}
-            else:
-                file_object = models.File.query.filter(
-                    sqlalchemy.and_(
-                        models.File.name == sqlalchemy.func.binary(file),
-                        models.File.project_id == proj_in_db.id,
-                    )
-                ).first()
-                if file_object:
-                    errors[file] = {"error": "File already in database."}
-                else:
-                    new_file = models.File(
-                        name=file,
-                        name_in_bucket=vals["path_remote"],
-                        subpath=vals["subpath"],
-                        project_id=proj_in_db.id,
-                        size_original=vals["size_raw"],
-                        size_stored=vals["size_processed"],
-                        compressed=not vals["compressed"],
-                        public_key=vals["public_key"],
-                        salt=vals["salt"],
-                        checksum=vals["checksum"],
-                    )
-                    new_version = models.Version(
-                        size_stored=new_file.size_stored, time_uploaded=datetime.datetime.utcnow()
+                if err.response["Error"]["Code"] not in ["404", "NoSuchBucket"]:
+                    raise
+                app.logger.warning("Missing bucket %s", project.bucket)
+                return None
+
+            if not full and db_tools.lost_files_state_unchanged(project=project, state=state):
+                return 0, 0, True
+
+            def s3_keys():
+                for page in client.get_paginator("list_objects_v2").paginate(
+                    Bucket=project.bucket, PaginationConfig={"PageSize": batch_size}
+                ):
+                    yield from (x["Key"] for x in page.get("Contents", []))
+
+            def db_keys():
+                # Ordered by the bytes, like the S3 listing, whatever the collation.
+                # The names in the bucket are not unique in the database, skip duplicates.
+                previous = None
+                for x in (
+                    db.session.query(models.File.name_in_bucket)
+                    .filter(models.File.project_id == project_id)
+                    .order_by(sqlalchemy.func.binary(models.File.name_in_bucket))
+                    .execution_options(stream_results=True)
+                    .yield_per(batch_size)
+                ):
+                    if x.name_in_bucket != previous:
+                        yield x.name_in_bucket
+                    previous = x.name_in_bucket
+
+            def delete_from_s3(keys):
+                client.delete_objects(
+                    Bucket=project.bucket,
+                    Delete={"Objects": [{"Key": x} for x in keys], "Quiet": True},
+                )
+
+            db_count, s3_count = (0, 0)
+            diff_db, diff_s3 = ([], [])
+            try:
+                for key, only_in_s3 in utils.sorted_difference(s3_keys(), db_keys()):
+                    if only_in_s3:
+                        s3_count += 1
+                        if action_type == "list":
+                            app.logger.info(
+                                "Entry %s (%s, %s) not found in database", key, project, unit_name
+                            )
+                        elif action_type == "delete":
+                            # s3 can only delete 1000 objects per request
+                            diff_s3.append(key)
+                            if len(diff_s3) == batch_size:
+                                delete_from_s3(keys=diff_s3)
+                                diff_s3 = []
+                    else:
+                        db_count += 1
+                        if action_type == "list":
+                            app.logger.info(
+                                "Entry %s (%s, %s) not found in S3", key, project, unit_name
+                            )
+                        elif action_type == "delete":
+                            diff_db.append(key)
+            except client.exceptions.NoSuchBucket:
+                app.logger.warning("Missing bucket %s", project.bucket)
+                return None
+
+            if diff_s3:
+                delete_from_s3(keys=diff_s3)
+
+            if action_type == "delete":
+                for i in range(0, len(diff_db), batch_size):
+                    db_entries = (
+                        models.File.query.filter(
+                            sqlalchemy.and_(
+                                models.File.project_id == project_id,
+                                sqlalchemy.func.binary(models.File.name_in_bucket).in_(
+                                    diff_db[i : i + batch_size]
+                                ),
+                            )
+                        )
+                        .with_entities(
+                            models.File.id,
+                            models.File.subpath,
+                            models.File.size_original,
+                            models.File.size_stored,
+                        )
+                        .all()
                     )
-                    proj_in_db.file_versions.append(new_version)
-                    proj_in_db.files.append(new_file)
-                    new_file.versions.append(new_version)
+                    db_tools.delete_files(project=project, files=db_entries)
+                    db.session.commit()
 
-                    db.session.add(new_file)
-                    files_added.append(new_file)
+            # Remember the state of the project if there was nothing to do
+            if not db_count and not s3_count:
+                db_tools.save_lost_files_watermark(project=project, state=state)
                 db.session.commit()
 
-        flask.current_app.logger.info(f"Files added: {files_added}")
-        flask.current_app.logger.info(f"Errors while adding files: {errors}")
+            return db_count, s3_count, False
+        except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError):
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
 
 
 @click.command("lost-files")
 @click.argument("action_type", type=click.Choice(["find", "list", "delete"]))
+@click.option("--workers", "-w", type=int, required=False, default=4)
+@click.option("--full", is_flag=True, default=False)
 @flask.cli.with_appcontext
-def lost_files_s3_db(action_type: str):
+def lost_files_s3_db(action_type: str, workers: int, full: bool):
     """
     Identify (and optionally delete) files that are present in S3 or in the db, but not both.
 
+    The projects of each unit are checked concurrently, by the specified number of workers.
+    Projects which are unchanged since they last had no lost files are skipped, unless full.
+
     Args:
         action_type (str): "find", "list", or "delete"
     """
+    import botocore.exceptions
+    import concurrent.futures
+    import time
+
     from dds_web.database import models
-    import boto3
 
-    for unit in models.Unit.query:
-        session = boto3.session.Session()
+    app = flask.current_app._get_current_object()
 
-        resource = session.resource(
-            service_name="s3",
-            endpoint_url=unit.safespring_endpoint,
-            aws_access_key_id=unit.safespring_access,
-            aws_secret_access_key=unit.safespring_secret,
-        )
+    db_count = 0
+    s3_count = 0
+    failed = []
+    for unit in models.Unit.query:
+        credentials = {
+            "endpoint_url": unit.safespring_endpoint,
+            "access_key": unit.safespring_access,
+            "secret_key": unit.safespring_secret,
+        }
+        projects = {
+            x.id: x.public_id
+            for x in models.Project.query.filter_by(unit_id=unit.id).with_entities(
+                models.Project.id, models.Project.public_id
+            )
+        }
 
-        db_count = 0
-        s3_count = 0
-        for project in unit.projects:
-            try:
-                s3_filenames = set(
-                    entry.key for entry in resource.Bucket(project.bucket).objects.all()
+        start = time.perf_counter()
+        unit_db_count, unit_s3_count, num_skipped = (0, 0, 0)
+        db_unavailable = False
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    reconcile_project_files,
+                    app=app,
+                    unit_name=unit.name,
+                    credentials=credentials,
+                    project_id=project_id,
+                    action_type=action_type,
+                    full=full,
+                ): project_id
+                for project_id in projects
+            }
+            for num_done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+                try:
+                    counts = future.result()
+                except sqlalchemy.exc.OperationalError:
+                    # Do not start the remaining projects, exit once the running ones are done
+                    flask.current_app.logger.critical("Unable to connect to db")
+                    db_unavailable = True
+                    for x in futures:
+                        x.cancel()
+                    break
+                except (
+                    sqlalchemy.exc.SQLAlchemyError,
+                    botocore.exceptions.BotoCoreError,
+                    botocore.exceptions.ClientError,
+                    ValueError,
+                ) as err:
+                    # Report the project and continue with the others
+                    public_id = projects[futures[future]]
+                    flask.current_app.logger.error(
+                        "%s: Could not check project %s: %s", unit.name, public_id, err
+                    )
+                    failed.append(public_id)
+                    counts = None
+
+                if counts:
+                    unit_db_count += counts[0]
+                    unit_s3_count += counts[1]
+                    num_skipped += counts[2]
+                flask.current_app.logger.debug(
+                    "%s: %d/%d projects checked", unit.name, num_done, len(futures)
                 )
-            except resource.meta.client.exceptions.NoSuchBucket:
-                flask.current_app.logger.warning("Missing bucket %s", project.bucket)
-                continue
 
-            try:
-                db_filenames = set(entry.name_in_bucket for entry in project.files)
-            except sqlalchemy.exc.OperationalError:
-                flask.current_app.logger.critical("Unable to connect to db")
-
-            diff_db = db_filenames.difference(s3_filenames)
-            diff_s3 = s3_filenames.difference(db_filenames)
-            if action_type == "list":
-                for file_entry in diff_db:
-                    flask.current_app.logger.info(
-                        "Entry %s (%s, %s) not found in S3", file_entry, project, unit
-                    )
-                for file_entry in diff_s3:
-                    flask.current_app.logger.info(
-                        "Entry %s (%s, %s) not found in database", file_entry, project, unit
-                    )
-            elif action_type == "delete":
-                # s3 can only delete 1000 objects per request
-                batch_size = 1000
-                s3_to_delete = list(diff_s3)
-                for i in range(0, len(s3_to_delete), batch_size):
-                    resource.meta.client.delete_objects(
-                        Bucket=project.bucket,
-                        Delete={
-                            "Objects": [
-                                {"Key": entry} for entry in s3_to_delete[i : i + batch_size]
-                            ]
-                        },
-                    )
+        if db_unavailable:
+            sys.exit(1)
 
-                db_entries = models.File.query.filter(
-                    sqlalchemy.and_(
-                        models.File.name_in_bucket.in_(diff_db),
-                        models.File.project_id == project.id,
-                    )
-                )
-                for db_entry in db_entries:
-                    try:
-                        for db_entry_version in db_entry.versions:
-                            if db_entry_version.time_deleted is None:
-                                db_entry_version.time_deleted = datetime.datetime.utcnow()
-                        db.session.delete(db_entry)
-                        db.session.commit()
-                    except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError):
-                        db.session.rollback()
-                        flask.current_app.logger.critical("Unable to delete the database entries")
-                        sys.exit(1)
-
-            # update the counters at the end of the loop to have accurate numbers for delete
-            s3_count += len(diff_s3)
-            db_count += len(diff_db)
+        flask.current_app.logger.info(
+            "%s: %d projects checked (%d unchanged) in %.1f s, %d lost files (%d in db, %d in s3)",
+            unit.name,
+            len(projects),
+            num_skipped,
+            time.perf_counter() - start,
+            unit_db_count + unit_s3_count,
+            unit_db_count,
+            unit_s3_count,
+        )
+        db_count += unit_db_count
+        s3_count += unit_s3_count
 
     if s3_count or db_count:
         action_word = "Found" if action_type in ("find", "list") else "Deleted"
@@ -554,8 +769,42 @@ def lost_files_s3_db(action_type: str):
             db_count,
             s3_count,
         )
-        if action_type in ("find", "list"):
-            sys.exit(1)
-
     else:
         flask.current_app.logger.info("Found no lost files")
+
+    if failed:
+        flask.current_app.logger.error(
+            "Could not check %d projects: %s", len(failed), ", ".join(failed)
+        )
+        sys.exit(1)
+
+    if (s3_count or db_count) and action_type in ("find", "list"):
+        sys.exit(1)
+
+
+@click.command("update-project-totals")
+@click.option("--project", "-p", type=str, required=False)
+@flask.cli.with_appcontext
+def update_project_totals(project):
+    """Recalculate the file count and total sizes of all projects (or one) from their files."""
+    from dds_web.api import db_tools
+    from dds_web.database import models
+
+    projects = models.Project.query
+    if project:
+        projects = projects.filter_by(public_id=project)
+
+    num_updated = 0
+    for project_row in projects.all():
+        try:
+            db_tools.recompute_project_totals(project=project_row)
+            db.session.commit()
+        except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError):
+            db.session.rollback()
+            flask.current_app.logger.critical(
+                "Unable to update the totals of project %s", project_row.public_id
+            )
+            sys.exit(1)
+        num_updated += 1
+
+    flask.current_app.logger.info("Updated the totals of %d projects", num_updated)
@@ -5,19 +5,26 @@
 ####################################################################################################
 
 # Standard library
+import base64
+import collections
+import concurrent.futures
+import hashlib
+import hmac
 import logging
 import traceback
+import urllib.parse
 
 # Installed
+import botocore.exceptions
+import botocore.utils
 
 # Own modules
+from dds_web.api import s3_cache
 from dds_web.api.dds_decorators import (
     connect_cloud,
     bucket_must_exists,
 )
 
-from dds_web.database import models
-
 
 ####################################################################################################
 # LOGGING ################################################################################ LOGGING #
@@ -38,6 +45,7 @@ class ApiS3Connector:
     def __init__(self, project=None):
         self.project = project
         self.resource = None
+        self.bucket_exists = False
 
     @connect_cloud
     def __enter__(self):
@@ -52,15 +60,13 @@ class ApiS3Connector:
 
     def get_s3_info(self):
         """Get information required to connect to cloud."""
+        # The unit is loaded with the project, no need for another query
+        unit = self.project.responsible_unit
         endpoint, name, accesskey, secretkey = (
-            models.Unit.query.filter_by(id=self.project.responsible_unit.id)
-            .with_entities(
-                models.Unit.safespring_endpoint,
-                models.Unit.safespring_name,
-                models.Unit.safespring_access,
-                models.Unit.safespring_secret,
-            )
-            .one_or_none()
+            unit.safespring_endpoint,
+            unit.safespring_name,
+            unit.safespring_access,
+            unit.safespring_secret,
         )
         bucket = self.project.bucket
 
@@ -72,34 +78,124 @@ class ApiS3Connector:
         )
 
     @bucket_must_exists
-    def remove_bucket(self, *args, **kwargs):
-        """Removes all contents from the project specific s3 bucket."""
-        # Get bucket object
-        bucket = self.resource.Bucket(self.project.bucket)
+    def remove_bucket(self, start_after=None, checkpoint=None, max_workers: int = 8, **kwargs):
+        """Removes all contents from the project specific s3 bucket, and then the bucket.
 
+        See purge_bucket for the arguments.
+        """
         # Delete objects first
-        bucket.objects.all().delete()
+        self.purge_bucket(start_after=start_after, checkpoint=checkpoint, max_workers=max_workers)
+
+        # Delete bucket. Objects uploaded during the purge or, when resuming, before the
+        # checkpoint are not listed, so purge the whole bucket once more if any are left.
+        try:
+            self.resource.meta.client.delete_bucket(Bucket=self.project.bucket)
+        except botocore.exceptions.ClientError as err:
+            if err.response.get("Error", {}).get("Code") != "BucketNotEmpty":
+                raise
+
+            self.purge_bucket(max_workers=max_workers)
+            self.resource.meta.client.delete_bucket(Bucket=self.project.bucket)
+        self.bucket_exists = False
+        s3_cache.forget_bucket(self.url, self.bucketname)
+
+    def purge_bucket(
+        self, start_after=None, checkpoint=None, max_workers: int = 8, batch_size: int = 1000
+    ):
+        """Delete all objects in the bucket, listing them one page at a time.
+
+        Each page of at most 1000 keys (the S3 limit) is deleted with one delete_objects request
+        in a pool of max_workers threads sharing the client. At most two pages per thread are
+        listed ahead of the deletions.
+
+        start_after: Only delete the keys after this one, to resume an interrupted purge.
+        checkpoint: Called with (last key, number of keys) in key order as soon as all keys up to
+            and including the last key are deleted, e.g. to save where to resume.
+
+        Raises a ClientError for the first key which could not be deleted.
+        """
+        client = self.resource.meta.client
+        list_args = {"Bucket": self.project.bucket, "PaginationConfig": {"PageSize": batch_size}}
+        if start_after:
+            list_args["StartAfter"] = start_after
+
+        def delete_keys(keys):
+            response = client.delete_objects(
+                Bucket=self.project.bucket,
+                Delete={"Objects": [{"Key": x} for x in keys], "Quiet": True},
+            )
+            if response.get("Errors"):
+                error = response["Errors"][0]
+                raise botocore.exceptions.ClientError(
+                    {
+                        "Error": {
+                            "Code": error.get("Code"),
+                            "Message": f"{error.get('Key')}: {error.get('Message')}",
+                        }
+                    },
+                    "DeleteObjects",
+                )
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = collections.deque()
+
+            def finish_first():
+                last_key, num_keys, future = pending.popleft()
+                future.result()
+                if checkpoint:
+                    checkpoint(last_key, num_keys)
+
+            try:
+                for page in client.get_paginator("list_objects_v2").paginate(**list_args):
+                    keys = [x["Key"] for x in page.get("Contents", [])]
+                    if not keys:
+                        continue
+
+                    pending.append((keys[-1], len(keys), executor.submit(delete_keys, keys)))
+                    while pending and (len(pending) > 2 * max_workers or pending[0][2].done()):
+                        finish_first()
+
+                while pending:
+                    finish_first()
+            finally:
+                for _, _, future in pending:
+                    future.cancel()
 
-        # Delete bucket
-        bucket.delete()
-        bucket = None
+    @staticmethod
+    def bucket_statistics(client, bucket):
+        """Get the number of objects and bytes in the bucket without listing it.
+
+        Ceph RGW (used by Safespring) returns the statistics in the HEAD bucket response.
+        Returns None if the S3 service does not.
+        """
+        headers = client.head_bucket(Bucket=bucket)["ResponseMetadata"]["HTTPHeaders"]
+        try:
+            return int(headers["x-rgw-object-count"]), int(headers["x-rgw-bytes-used"])
+        except (KeyError, ValueError):
+            return None
 
     @bucket_must_exists
     def remove_multiple(self, items, batch_size: int = 1000, *args, **kwargs):
-        """Removes all with prefix."""
+        """Removes all with prefix. Returns the error messages for the keys not removed."""
+        errors = {}
         # s3 can only delete 1000 objects per request
         for i in range(0, len(items), batch_size):
-            _ = self.resource.meta.client.delete_objects(
+            response = self.resource.meta.client.delete_objects(
                 Bucket=self.project.bucket,
-                Delete={"Objects": [{"Key": x} for x in items[i : i + batch_size]]},
+                Delete={"Objects": [{"Key": x} for x in items[i : i + batch_size]], "Quiet": True},
+            )
+            errors.update(
+                {x["Key"]: x.get("Message", x.get("Code")) for x in response.get("Errors", [])}
             )
 
+        return errors
+
     @bucket_must_exists
     def remove_one(self, file, *args, **kwargs):
         """Removes file from s3"""
         _ = self.resource.meta.client.delete_object(Bucket=self.project.bucket, Key=file)
 
-    def generate_get_url(self, key):
+    def generate_get_url(self, key, expires_in: int = 604800):
         """Generate presigned urls for get requests."""
 
         # This does not perform any requests, the signing is "local"
@@ -107,6 +203,70 @@ class ApiS3Connector:
         url = self.resource.meta.client.generate_presigned_url(
             "get_object",
             Params={"Bucket": self.project.bucket, "Key": key},
-            ExpiresIn=604800,  # 7 days in seconds
+            ExpiresIn=expires_in,  # default 7 days in seconds
         )
         return url
+
+    def generate_get_urls(self, keys, expires_in: int = 604800):
+        """Generate presigned urls for get requests for many keys, in the same order as the keys.
+
+        The first url is generated by boto3. All other urls are signed locally in exactly the
+        same way with the same expiry time, only the object key differs. If the boto3 url
+        cannot be reproduced, each url is generated by boto3 instead.
+        """
+        keys = list(keys)
+        if not keys:
+            return []
+
+        first_url = self.generate_get_url(key=keys[0], expires_in=expires_in)
+        sign = self.query_string_signer(key=keys[0], url=first_url)
+        if sign is None:
+            return [first_url] + [
+                self.generate_get_url(key=x, expires_in=expires_in) for x in keys[1:]
+            ]
+
+        return [first_url] + [sign(x) for x in keys[1:]]
+
+    def query_string_signer(self, key, url):
+        """Get a function signing urls for other keys like the presigned url for the key.
+
+        boto3 presigns S3 urls with the query string authentication (HMAC-SHA1) unless the
+        signature version is set in the client config. The bucket, expiry time and HMAC state
+        are only set up once here. Returns None if the signed url for the key is not
+        identical to the boto3 url, e.g. if the url is signed with SigV4.
+        """
+        try:
+            split_url = urllib.parse.urlsplit(url)
+            query = urllib.parse.parse_qs(split_url.query, strict_parsing=True)
+            expires = query["Expires"][0]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+        quoted_key = botocore.utils.percent_encode(key, safe="/~")
+        if len(query) != 3 or not split_url.path.endswith(quoted_key):
+            return None
+
+        path_prefix = split_url.path[: len(split_url.path) - len(quoted_key)]
+        url_prefix = f"{split_url.scheme}://{split_url.netloc}{path_prefix}"
+        query_prefix = f"?AWSAccessKeyId={botocore.utils.percent_encode(self.keys['access_key'])}"
+        query_suffix = f"&Expires={expires}"
+        base_hmac = hmac.new(self.keys["secret_key"].encode("utf-8"), digestmod=hashlib.sha1)
+
+        # The signed resource always includes the bucket, also for virtual hosted-style urls
+        for resource_prefix in (path_prefix, f"/{self.project.bucket}{path_prefix}"):
+            string_to_sign_prefix = f"GET\n\n\n{expires}\n{resource_prefix}"
+
+            def sign(key, string_to_sign_prefix=string_to_sign_prefix):
+                quoted_key = botocore.utils.percent_encode(key, safe="/~")
+                signature = base_hmac.copy()
+                signature.update(f"{string_to_sign_prefix}{quoted_key}".encode("utf-8"))
+                signature = base64.b64encode(signature.digest()).decode("utf-8")
+                return (
+                    f"{url_prefix}{quoted_key}{query_prefix}"
+                    f"&Signature={botocore.utils.percent_encode(signature)}{query_suffix}"
+                )
+
+            if sign(key) == url:
+                return sign
+
+        return None
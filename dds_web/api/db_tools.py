@@ -5,13 +5,18 @@
 ####################################################################################################
 
 # Standard library
+import contextlib
+import datetime
+import os
 
 # Installed
 import sqlalchemy
+from sqlalchemy.dialects import mysql
 
 # Own modules
 from dds_web.database import models
 from dds_web import db
+import dds_web.utils
 from dds_web.errors import (
     DatabaseError,
     UserDeletionError,
@@ -49,3 +54,477 @@ def remove_user_self_deletion_request(user):
         ) from err
 
     return email
+
+
+@contextlib.contextmanager
+def temporary_table(name: str, *columns, rows=None, batch_size: int = 1000):
+    """Create and fill a temporary table for joins on the current database connection.
+
+    The table only exists within the connection of the current session and is dropped on exit.
+    """
+    table = sqlalchemy.Table(name, sqlalchemy.MetaData(), *columns, prefixes=["TEMPORARY"])
+    drop_statement = sqlalchemy.text(f"DROP TEMPORARY TABLE IF EXISTS {name}")
+
+    connection = db.session.connection()
+    connection.execute(drop_statement)
+    table.create(bind=connection)
+    try:
+        # Insert the rows in batches, one statement per batch
+        batch = []
+        for row in rows or []:
+            batch.append(row)
+            if len(batch) == batch_size:
+                connection.execute(table.insert(), batch)
+                batch = []
+        if batch:
+            connection.execute(table.insert(), batch)
+
+        yield table
+    finally:
+        db.session.connection().execute(drop_statement)
+
+
+def existing_file_names(project, names, batch_size: int = 1000):
+    """Return the names (out of the specified ones) which already exist in the project."""
+    names = list(names)
+    existing = set()
+    for i in range(0, len(names), batch_size):
+        existing.update(
+            x.name
+            for x in models.File.query.filter(
+                sqlalchemy.and_(
+                    models.File.project_id == sqlalchemy.func.binary(project.id),
+                    models.File.name_sha256.in_(
+                        [dds_web.utils.sha256_digest(x) for x in names[i : i + batch_size]]
+                    ),
+                )
+            ).with_entities(models.File.name)
+        )
+
+    return existing
+
+
+def inserted_ids_consecutive():
+    """Check if the rows of one multi-row INSERT get consecutive ids, returning the increment.
+
+    This is the case unless InnoDB interleaves the auto-increment values of concurrent inserts
+    (innodb_autoinc_lock_mode 2). Returns None if they may not be consecutive.
+    """
+    increment, lock_mode = db.session.execute(
+        sqlalchemy.text("SELECT @@auto_increment_increment, @@innodb_autoinc_lock_mode")
+    ).one()
+
+    return int(increment) if int(lock_mode) < 2 else None
+
+
+def insert_files(project, files: list, batch_size: int = 1000):
+    """Add new files and their first versions to the database with bulk inserts.
+
+    The files are expected to be validated (e.g. with the FileInfoSchema) and to not exist
+    in the project already. The versions are connected to the ids generated for the file rows.
+    Nothing is committed.
+    """
+    if not files:
+        return
+
+    timestamp = dds_web.utils.current_time()
+    id_increment = inserted_ids_consecutive()
+    for i in range(0, len(files), batch_size):
+        batch = files[i : i + batch_size]
+        rows = [
+            {
+                "project_id": project.id,
+                "name": x["name"],
+                "name_in_bucket": x["name_in_bucket"],
+                "subpath": x["subpath"],
+                "size_original": x["size"],
+                "size_stored": x["size_processed"],
+                "compressed": x["compressed"],
+                "salt": x["salt"],
+                "public_key": x["public_key"],
+                "checksum": x["checksum"],
+                "time_uploaded": timestamp,
+            }
+            for x in batch
+        ]
+
+        if id_increment:
+            # Insert all file rows in a single statement, the id of the first row is returned
+            first_id = db.session.execute(models.File.__table__.insert().values(rows)).lastrowid
+            file_ids = [first_id + j * id_increment for j in range(len(rows))]
+        else:
+            file_ids = [
+                db.session.execute(models.File.__table__.insert().values(x)).lastrowid for x in rows
+            ]
+
+        db.session.execute(
+            models.Version.__table__.insert(),
+            [
+                {
+                    "project_id": project.id,
+                    "active_file": file_id,
+                    "size_stored": x["size_stored"],
+                    "time_uploaded": timestamp,
+                }
+                for file_id, x in zip(file_ids, rows)
+            ],
+        )
+
+    update_folder_tree(
+        project=project,
+        changes=[(x["subpath"], 1, x["size"]) for x in files],
+        batch_size=batch_size,
+    )
+    update_project_totals(
+        project=project,
+        file_count=len(files),
+        size_original=sum(x["size"] for x in files),
+        size_stored=sum(x["size_processed"] for x in files),
+    )
+
+    project.date_updated = timestamp
+
+
+def delete_files(project, files: list, batch_size: int = 1000):
+    """Delete the files from the database and mark their current versions as deleted.
+
+    The files need the id, subpath, size_original and size_stored columns. One UPDATE of the
+    versions and one DELETE of the files per batch. Nothing is committed.
+    """
+    if not files:
+        return
+
+    timestamp = dds_web.utils.current_time()
+    update_folder_tree(
+        project=project,
+        changes=[(x.subpath, -1, -x.size_original) for x in files],
+        batch_size=batch_size,
+    )
+    update_project_totals(
+        project=project,
+        file_count=-len(files),
+        size_original=-sum(x.size_original for x in files),
+        size_stored=-sum(x.size_stored for x in files),
+    )
+
+    file_ids = [x.id for x in files]
+    for i in range(0, len(file_ids), batch_size):
+        batch_ids = file_ids[i : i + batch_size]
+        models.Version.query.filter(
+            sqlalchemy.and_(
+                models.Version.active_file.in_(batch_ids),
+                models.Version.time_deleted.is_(None),
+            )
+        ).update({"time_deleted": timestamp})
+
+        # The versions keep their history, the foreign key sets active_file to NULL
+        models.File.query.filter(models.File.id.in_(batch_ids)).delete()
+
+    project.date_updated = timestamp
+
+
+def folder_paths(subpath: str):
+    """Return the paths of all folders which contain files in the specified subpath."""
+    subpath = subpath.strip(os.sep)
+    if subpath in ["", "."]:
+        return []
+
+    parts = subpath.split(os.sep)
+    return [os.sep.join(parts[: i + 1]) for i in range(len(parts))]
+
+
+def update_folder_tree(project, changes, batch_size: int = 1000):
+    """Update the number of files and total size of the project folders.
+
+    changes: (subpath, number of files, size) for each change, negative numbers for removed files.
+    The change is applied to the subpath folder and all folders above it. Nothing is committed.
+    """
+    # Aggregate the changes per folder
+    deltas = {}
+    for subpath, num_files, size in changes:
+        for path in folder_paths(subpath=subpath):
+            file_count, total_size = deltas.get(path, (0, 0))
+            deltas[path] = (file_count + num_files, total_size + size)
+
+    rows = []
+    for path, (file_count, total_size) in deltas.items():
+        parent = os.path.dirname(path) or "."
+        rows.append(
+            {
+                "project_id": project.id,
+                "path": path,
+                "path_hash": dds_web.utils.sha256_digest(path),
+                "parent": parent,
+                "parent_hash": dds_web.utils.sha256_digest(parent),
+                "depth": path.count(os.sep) + 1,
+                "file_count": int(file_count),
+                "total_size": int(total_size),
+            }
+        )
+
+    folders_table = models.Folder.__table__
+    for i in range(0, len(rows), batch_size):
+        # Insert new folders and update the existing ones in a single statement
+        statement = mysql.insert(folders_table).values(rows[i : i + batch_size])
+        db.session.execute(
+            statement.on_duplicate_key_update(
+                file_count=folders_table.c.file_count + statement.inserted.file_count,
+                total_size=folders_table.c.total_size + statement.inserted.total_size,
+            )
+        )
+
+    # Remove the folders which no longer contain any files
+    removed_from = [x["path_hash"] for x in rows if x["file_count"] < 0]
+    for i in range(0, len(removed_from), batch_size):
+        db.session.execute(
+            folders_table.delete().where(
+                sqlalchemy.and_(
+                    folders_table.c.project_id == project.id,
+                    folders_table.c.path_hash.in_(removed_from[i : i + batch_size]),
+                    folders_table.c.file_count <= 0,
+                )
+            )
+        )
+
+
+def rebuild_folder_tree(project):
+    """Recalculate the folder tree of a project from its files. Nothing is committed."""
+    models.Folder.query.filter(models.Folder.project_id == project.id).delete()
+
+    # Select the grouped expression itself, which is valid with ONLY_FULL_GROUP_BY
+    binary_subpath = sqlalchemy.func.binary(models.File.subpath)
+    subpaths = (
+        db.session.query(
+            binary_subpath.label("subpath"),
+            sqlalchemy.func.count(models.File.id),
+            sqlalchemy.func.sum(models.File.size_original),
+        )
+        .filter(models.File.project_id == project.id)
+        .group_by(binary_subpath)
+    )
+    update_folder_tree(
+        project=project,
+        changes=[
+            (subpath.decode("utf-8"), num_files, size) for subpath, num_files, size in subpaths
+        ],
+    )
+
+
+def update_project_totals(
+    project, file_count: int = 0, size_original: int = 0, size_stored: int = 0
+):
+    """Change the file count and total sizes of the project, negative numbers for removed files.
+
+    The columns are incremented in the database, so concurrent uploads and deletions in the
+    same project do not overwrite each other. Nothing is committed.
+    """
+    if not any([file_count, size_original, size_stored]):
+        return
+
+    models.Project.query.filter(models.Project.id == project.id).update(
+        {
+            "file_count": models.Project.file_count + int(file_count),
+            "total_size_original": models.Project.total_size_original + int(size_original),
+            "total_size_stored": models.Project.total_size_stored + int(size_stored),
+        }
+    )
+
+
+def recompute_project_totals(project):
+    """Recalculate the file count and total sizes of a project from its files.
+
+    Nothing is committed.
+    """
+    file_count, size_original, size_stored = (
+        db.session.query(
+            sqlalchemy.func.count(models.File.id),
+            sqlalchemy.func.coalesce(sqlalchemy.func.sum(models.File.size_original), 0),
+            sqlalchemy.func.coalesce(sqlalchemy.func.sum(models.File.size_stored), 0),
+        )
+        .filter(models.File.project_id == project.id)
+        .one()
+    )
+    project.file_count = int(file_count)
+    project.total_size_original = int(size_original)
+    project.total_size_stored = int(size_stored)
+
+
+def bucket_purge_last_key(bucket):
+    """Get the last key deleted by an unfinished removal of the bucket objects, if any."""
+    return (
+        db.session.query(models.BucketPurge.last_key)
+        .filter(models.BucketPurge.bucket == bucket)
+        .scalar()
+    )
+
+
+def save_bucket_purge_progress(bucket, last_key, num_deleted: int):
+    """Save that all bucket objects up to and including the key have been deleted.
+
+    The progress is committed in a separate transaction, so that it is kept even if the
+    current session is rolled back.
+    """
+    timestamp = dds_web.utils.current_time()
+    purges_table = models.BucketPurge.__table__
+    statement = mysql.insert(purges_table).values(
+        bucket=bucket,
+        last_key=last_key,
+        objects_deleted=num_deleted,
+        time_started=timestamp,
+        time_updated=timestamp,
+    )
+    with db.engine.begin() as connection:
+        connection.execute(
+            statement.on_duplicate_key_update(
+                last_key=statement.inserted.last_key,
+                objects_deleted=purges_table.c.objects_deleted + statement.inserted.objects_deleted,
+                time_updated=statement.inserted.time_updated,
+            )
+        )
+
+
+def remove_bucket_purge_progress(bucket):
+    """Forget the progress of the removal of the bucket objects once the bucket is gone."""
+    with db.engine.begin() as connection:
+        connection.execute(
+            models.BucketPurge.__table__.delete().where(models.BucketPurge.bucket == bucket)
+        )
+
+
+def lost_files_state(project, s3_statistics):
+    """Get the state of the project compared between runs of the lost-files check."""
+    s3_object_count, s3_bytes_used = s3_statistics or (None, None)
+    return {
+        "project_updated": project.date_updated,
+        "file_count": project.file_count,
+        "total_size_stored": project.total_size_stored,
+        "s3_object_count": s3_object_count,
+        "s3_bytes_used": s3_bytes_used,
+    }
+
+
+def lost_files_state_unchanged(project, state):
+    """Check if the project has the same state as when it last had no lost files."""
+    if state["s3_object_count"] is None:
+        return False
+
+    watermark = models.LostFilesWatermark.query.get(project.id)
+    return watermark is not None and all(getattr(watermark, x) == y for x, y in state.items())
+
+
+def save_lost_files_watermark(project, state):
+    """Save the state of a project without lost files. Nothing is committed."""
+    watermarks_table = models.LostFilesWatermark.__table__
+    statement = mysql.insert(watermarks_table).values(
+        project_id=project.id, time_checked=dds_web.utils.current_time(), **state
+    )
+    db.session.execute(
+        statement.on_duplicate_key_update(
+            {x: statement.inserted[x] for x in ["time_checked", *state.keys()]}
+        )
+    )
+
+
+def version_usage(until):
+    """Return the start and end of the part of each version which is not rolled up until the time,
+    and the byte seconds stored during it."""
+    start = sqlalchemy.func.coalesce(models.Version.time_invoiced, models.Version.time_uploaded)
+    end = sqlalchemy.func.least(sqlalchemy.func.coalesce(models.Version.time_deleted, until), until)
+
+    # DECIMAL to avoid BIGINT overflow for large files stored for a long time
+    byte_seconds = sqlalchemy.cast(
+        models.Version.size_stored, sqlalchemy.Numeric(65, 0)
+    ) * sqlalchemy.func.timestampdiff(sqlalchemy.text("SECOND"), start, end)
+
+    return start, end, byte_seconds
+
+
+def usage_rollup_start(until):
+    """Return the first day with usage which has not been rolled up until the time, if any."""
+    start, end, _ = version_usage(until=until)
+    first_start = db.session.query(sqlalchemy.func.min(start)).filter(start < end).scalar()
+
+    return first_start.date() if first_start else None
+
+
+def rollup_usage_day(day):
+    """Add the byte hours stored during the day to the daily usage of the projects and mark the
+    versions as invoiced until the end of the day. Nothing is committed.
+
+    The days need to be rolled up in order from usage_rollup_start, so that no version has usage
+    left before the day.
+    """
+    day_end = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time())
+    start, end, byte_seconds = version_usage(until=day_end)
+
+    usage_table = models.UsageDaily.__table__
+    statement = mysql.insert(usage_table).from_select(
+        ["project_id", "day", "byte_hours"],
+        sqlalchemy.select(
+            models.Version.project_id,
+            sqlalchemy.literal(day, sqlalchemy.Date),
+            sqlalchemy.func.sum(byte_seconds) / (60 * 60),
+        )
+        .where(start < end)
+        .group_by(models.Version.project_id),
+    )
+    db.session.execute(
+        statement.on_duplicate_key_update(
+            byte_hours=usage_table.c.byte_hours + statement.inserted.byte_hours
+        )
+    )
+    models.Version.query.filter(start < end).update(
+        {models.Version.time_invoiced: end}, synchronize_session=False
+    )
+
+
+def project_byte_hours(projects_query):
+    """Return the byte hours stored by each project in the query, by project id.
+
+    All versions are included, also the ones of deleted files, and the current versions are
+    counted until now. The daily rollups are summed and only the versions which may have usage
+    after the last rolled up day are read, which keeps the cost independent of the history.
+    """
+    now = dds_web.utils.current_time()
+    start, end, byte_seconds = version_usage(until=now)
+
+    # Usage which has been rolled up
+    rolled_up = (
+        projects_query.join(models.UsageDaily, models.UsageDaily.project_id == models.Project.id)
+        .with_entities(
+            models.UsageDaily.project_id,
+            sqlalchemy.func.sum(models.UsageDaily.byte_hours).label("byte_hours"),
+        )
+        .group_by(models.UsageDaily.project_id)
+    )
+    usage = {x.project_id: float(x.byte_hours) for x in rolled_up}
+
+    # Versions deleted before the end of the last rolled up day have no usage left
+    last_day = db.session.query(sqlalchemy.func.max(models.UsageDaily.day)).scalar()
+    not_rolled_up = start < end
+    if last_day:
+        rolled_up_until = datetime.datetime.combine(
+            last_day + datetime.timedelta(days=1), datetime.time()
+        )
+        not_rolled_up = sqlalchemy.and_(
+            sqlalchemy.or_(
+                models.Version.time_deleted.is_(None),
+                models.Version.time_deleted > rolled_up_until,
+            ),
+            not_rolled_up,
+        )
+
+    # Usage since the last rollup
+    remaining = (
+        projects_query.join(models.Version, models.Version.project_id == models.Project.id)
+        .with_entities(
+            models.Version.project_id,
+            sqlalchemy.func.sum(byte_seconds).label("byte_seconds"),
+        )
+        .filter(not_rolled_up)
+        .group_by(models.Version.project_id)
+    )
+    for x in remaining:
+        usage[x.project_id] = usage.get(x.project_id, 0.0) + float(x.byte_seconds or 0) / (60 * 60)
+
+    return usage
@@ -8,7 +8,6 @@
 import functools
 
 # Installed
-import boto3
 import botocore
 import flask
 import structlog
@@ -17,6 +16,7 @@ import marshmallow
 
 # Own modules
 from dds_web import db
+from dds_web.api import s3_cache
 from dds_web.errors import (
     BucketNotFoundError,
     DatabaseError,
@@ -137,13 +137,11 @@ def connect_cloud(func):
 
         try:
             _, self.keys, self.url, self.bucketname = self.get_s3_info()
-            # Connect to service
-            session = boto3.session.Session()
-            self.resource = session.resource(
-                service_name="s3",
+            # Connect to service, reusing the connections of earlier requests
+            self.resource = s3_cache.get_resource(
                 endpoint_url=self.url,
-                aws_access_key_id=self.keys["access_key"],
-                aws_secret_access_key=self.keys["secret_key"],
+                access_key=self.keys["access_key"],
+                secret_key=self.keys["secret_key"],
             )
         except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError) as sqlerr:
             raise DatabaseError(
@@ -170,12 +168,25 @@ def bucket_must_exists(func):
 
     @functools.wraps(func)
     def check_bucket_exists(self, *args, **kwargs):
+        # Only check once per connector and TTL window
+        if not (self.bucket_exists or s3_cache.bucket_verified(self.url, self.bucketname)):
+            try:
+                self.resource.meta.client.head_bucket(Bucket=self.bucketname)
+            except botocore.client.ClientError as err:
+                s3_cache.forget_bucket(self.url, self.bucketname)
+                raise BucketNotFoundError(message=str(err)) from err
+
+            s3_cache.set_bucket_verified(self.url, self.bucketname)
+        self.bucket_exists = True
+
         try:
-            self.resource.meta.client.head_bucket(Bucket=self.bucketname)
+            return func(self, *args, **kwargs)
         except botocore.client.ClientError as err:
-            raise BucketNotFoundError(message=str(err)) from err
-
-        return func(self, *args, **kwargs)
+            if err.response.get("Error", {}).get("Code") == "NoSuchBucket":
+                self.bucket_exists = False
+                s3_cache.forget_bucket(self.url, self.bucketname)
+                raise BucketNotFoundError(message=str(err)) from err
+            raise
 
     return check_bucket_exists
 
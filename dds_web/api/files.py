@@ -5,6 +5,10 @@
 ####################################################################################################
 
 # Standard library
+import base64
+import datetime
+import itertools
+import json
 import os
 import re
 
@@ -12,6 +16,7 @@ import re
 import botocore
 import flask
 import flask_restful
+import marshmallow
 import sqlalchemy
 import werkzeug
 
@@ -20,6 +25,7 @@ import dds_web.utils
 from dds_web import auth
 from dds_web.database import models
 from dds_web import db
+from dds_web.api import db_tools
 from dds_web.api.api_s3_connector import ApiS3Connector
 from dds_web.api.dds_decorators import (
     logging_bind_request,
@@ -37,6 +43,15 @@ from dds_web.api.schemas import file_schemas
 from dds_web.api.schemas import project_schemas
 
 
+def ndjson_response(lines):
+    """Stream newline-delimited JSON. Errors raised before the first line are returned as usual."""
+    first_line = next(lines, "")
+    return flask.Response(
+        flask.stream_with_context(itertools.chain([first_line], lines)),
+        mimetype="application/x-ndjson",
+    )
+
+
 def check_eligibility_for_upload(status):
     """Check if a project status is eligible for upload/modification"""
     if status != "In Progress":
@@ -86,6 +101,15 @@ class NewFile(flask_restful.Resource):
         # Verify that project has correct status for upload
         check_eligibility_for_upload(status=project.current_status)
 
+        # Register multiple files in one transaction
+        if isinstance(flask.request.json, list):
+            not_added_dict, existing_list = self.add_multiple(
+                project=project, files=flask.request.json
+            )
+
+            # Return added and not added files
+            return {"not_added": not_added_dict, "already_exists": existing_list}
+
         # Create new files
         new_file = file_schemas.NewFileSchema().load(
             {**flask.request.json, "project": project.public_id}
@@ -108,6 +132,51 @@ class NewFile(flask_restful.Resource):
 
         return {"message": f"File '{new_file.name}' added to db."}
 
+    def add_multiple(self, project, files):
+        """Add multiple files to the database."""
+        not_added_dict, existing_list = ({}, [])
+
+        # Validate the file information
+        valid_files = {}
+        file_info_schema = file_schemas.FileInfoSchema()
+        for entry in files:
+            name = entry.get("name") if isinstance(entry, dict) else None
+            if not isinstance(name, str) or not name:
+                raise DDSArgumentError("File name required for all files.")
+
+            if name in valid_files or name in not_added_dict:
+                not_added_dict[name] = "The file is specified more than once."
+                valid_files.pop(name, None)
+                continue
+
+            try:
+                valid_files[name] = file_info_schema.load(entry)
+            except marshmallow.ValidationError as valerr:
+                not_added_dict[name] = valerr.messages
+
+        try:
+            # Check which files are already in the db with one query per batch
+            for name in db_tools.existing_file_names(project=project, names=valid_files):
+                existing_list.append(name)
+                valid_files.pop(name)
+
+            db_tools.insert_files(project=project, files=list(valid_files.values()))
+            db.session.commit()
+        except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError) as err:
+            flask.current_app.logger.exception(err)
+            db.session.rollback()
+            raise DatabaseError(
+                message=str(err),
+                alt_message="Failed to add new files to database"
+                + (
+                    ": Database malfunction."
+                    if isinstance(err, sqlalchemy.exc.OperationalError)
+                    else "."
+                ),
+            ) from err
+
+        return not_added_dict, existing_list
+
     @auth.login_required(role=["Unit Admin", "Unit Personnel"])
     @logging_bind_request
     @handle_validation_errors
@@ -120,14 +189,16 @@ class NewFile(flask_restful.Resource):
         check_eligibility_for_upload(status=project.current_status)
 
         file_info = flask.request.json
-        if not all(x in file_info for x in ["name", "name_in_bucket", "subpath", "size"]):
+        if not all(
+            x in file_info for x in ["name", "name_in_bucket", "subpath", "size", "size_processed"]
+        ):
             raise DDSArgumentError("Information is missing, cannot add file to database.")
 
         try:
             # Check if file already in db
             existing_file = models.File.query.filter(
                 sqlalchemy.and_(
-                    models.File.name == sqlalchemy.func.binary(file_info.get("name")),
+                    models.File.name_sha256 == dds_web.utils.sha256_digest(file_info.get("name")),
                     models.File.project_id == project.id,
                 )
             ).first()
@@ -160,6 +231,20 @@ class NewFile(flask_restful.Resource):
                 if version.time_deleted is None:
                     version.time_deleted = new_timestamp
 
+            # Move the file within the folder tree
+            db_tools.update_folder_tree(
+                project=project,
+                changes=[
+                    (existing_file.subpath, -1, -existing_file.size_original),
+                    (file_info.get("subpath"), 1, file_info.get("size")),
+                ],
+            )
+            db_tools.update_project_totals(
+                project=project,
+                size_original=file_info.get("size") - existing_file.size_original,
+                size_stored=file_info.get("size_processed") - existing_file.size_stored,
+            )
+
             # Update file info
             existing_file.subpath = file_info.get("subpath")
             existing_file.size_original = file_info.get("size")
@@ -214,13 +299,15 @@ class MatchFiles(flask_restful.Resource):
         # Verify project has correct status for upload
         check_eligibility_for_upload(status=project.current_status)
 
+        file_names = flask.request.json
+        if not isinstance(file_names, list):
+            raise DDSArgumentError("A list of file names is required.")
+
         # Get files specified
+        matching_files = self.match_files(project=project, file_names=file_names)
         try:
-            matching_files = (
-                models.File.query.filter(models.File.name.in_(flask.request.json))
-                .filter(models.File.project_id == sqlalchemy.func.binary(project.id))
-                .all()
-            )
+            # Run the query before the response is streamed to catch any errors
+            first_chunk = next(matching_files)
         except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError) as err:
             raise DatabaseError(
                 message=str(err),
@@ -232,16 +319,57 @@ class MatchFiles(flask_restful.Resource):
                 ),
             ) from err
 
-        # The files checked are not in the db
-        if not matching_files or matching_files is None:
-            return {"files": None}
+        return flask.Response(
+            flask.stream_with_context(itertools.chain([first_chunk], matching_files)),
+            mimetype="application/json",
+        )
 
-        return {"files": {x.name: x.name_in_bucket for x in matching_files}}
+    @staticmethod
+    def match_files(project, file_names, batch_size: int = 1000):
+        """Generate the JSON response with the names in bucket of the matching files.
+
+        The digests of the specified names are joined against the indexed name digests of the
+        project files via a temporary table and the matches are read with a server-side cursor,
+        one batch at a time.
+        """
+        with db_tools.temporary_table(
+            "tmp_match_files",
+            sqlalchemy.Column("name_sha256", sqlalchemy.BINARY(32), nullable=False),
+            sqlalchemy.Index("ix_tmp_match_files_name_sha256", "name_sha256"),
+            rows=({"name_sha256": dds_web.utils.sha256_digest(x)} for x in set(file_names)),
+        ) as names_table:
+            result = db.session.execute(
+                sqlalchemy.select(models.File.name, models.File.name_in_bucket)
+                .join(names_table, names_table.c.name_sha256 == models.File.name_sha256)
+                .where(models.File.project_id == project.id)
+                .execution_options(stream_results=True)
+            )
+            try:
+                found_any = False
+                for rows in result.partitions(batch_size):
+                    matches = [
+                        f"{flask.json.dumps(x.name)}: {flask.json.dumps(x.name_in_bucket)}"
+                        for x in rows
+                    ]
+                    if not matches:
+                        continue
+
+                    yield ('{"files": {' if not found_any else ", ") + ", ".join(matches)
+                    found_any = True
+
+                # The files checked are not in the db
+                yield "}}" if found_any else '{"files": null}'
+            finally:
+                result.close()
 
 
 class ListFiles(flask_restful.Resource):
     """Lists files within a project"""
 
+    SORT_KEYS = ("name", "size", "time")
+    DEFAULT_PAGE_SIZE = 1000
+    MAX_PAGE_SIZE = 10000
+
     @auth.login_required(role=["Unit Admin", "Unit Personnel", "Project Owner", "Researcher"])
     @logging_bind_request
     @handle_validation_errors
@@ -271,6 +399,12 @@ class ListFiles(flask_restful.Resource):
         if project.num_files == 0:
             return {"num_items": 0, "message": f"The project {project.public_id} is empty."}
 
+        # Return one page at a time if the client asks for it
+        if any(x in extra_args for x in ["page_size", "cursor", "sort_by"]):
+            return self.list_page(
+                project=project, folder=subpath, show_size=show_size, extra_args=extra_args
+            )
+
         # Get files and folders
         distinct_files, distinct_folders = self.items_in_subpath(project=project, folder=subpath)
 
@@ -287,38 +421,79 @@ class ListFiles(flask_restful.Resource):
         if distinct_folders:
             for x in distinct_folders:
                 info = {
-                    "name": x if subpath == "." else x.split(os.sep)[-1],
+                    "name": x[0] if subpath == "." else x[0].split(os.sep)[-1],
                     "folder": True,
                 }
-
                 if show_size:
-                    folder_size = self.get_folder_size(project=project, folder_name=x)
-                    info.update({"size": folder_size})
+                    info.update({"size": x[1]})
                 files_folders.append(info)
 
         return {"files_folders": files_folders}
 
-    def get_folder_size(self, project, folder_name):
-        """Get total size of folder."""
-        # Sum up folder file sizes
+    def list_page(self, project, folder, show_size, extra_args):
+        """Get one page of the folder contents, sorted on the server.
+
+        Subfolders are listed before files. Each page ends with an opaque cursor ("next")
+        which is sent back to get the following page; it is None on the last page.
+        """
+        sort_by = extra_args.get("sort_by") or "name"
+        if sort_by not in self.SORT_KEYS:
+            raise DDSArgumentError(
+                message=f"Files can only be sorted by: {', '.join(self.SORT_KEYS)}."
+            )
+
+        page_size = extra_args.get("page_size", self.DEFAULT_PAGE_SIZE)
+        if (
+            not isinstance(page_size, int)
+            or isinstance(page_size, bool)
+            or not 0 < page_size <= self.MAX_PAGE_SIZE
+        ):
+            raise DDSArgumentError(
+                message=f"The page size must be an integer between 1 and {self.MAX_PAGE_SIZE}."
+            )
+
+        cursor = {"folders": True, "value": None, "id": None}
+        if extra_args.get("cursor"):
+            cursor = self.decode_cursor(cursor=extra_args.get("cursor"), sort_by=sort_by)
+
+        files_folders = []
+        next_cursor = None
         try:
-            file_info = (
-                models.File.query.with_entities(
-                    sqlalchemy.func.sum(models.File.size_original).label("sizeSum")
-                )
-                .filter(
-                    sqlalchemy.and_(
-                        models.File.project_id == sqlalchemy.func.binary(project.id),
-                        models.File.subpath.like(f"{folder_name}%"),
+            if cursor["folders"]:
+                folders = self.folders_page(
+                    project=project,
+                    folder=folder,
+                    sort_by=sort_by,
+                    after=cursor,
+                    limit=page_size + 1,
+                ).all()
+                for x in folders[:page_size]:
+                    info = {"name": x.path.split(os.sep)[-1], "folder": True}
+                    if show_size:
+                        info.update({"size": x.total_size})
+                    files_folders.append(info)
+
+                if len(folders) > page_size:
+                    last = folders[page_size - 1]
+                    next_cursor = self.encode_cursor(
+                        sort_by=sort_by,
+                        folders=True,
+                        value=last.total_size if sort_by == "size" else last.path,
+                        row_id=last.id,
                     )
-                )
-                .first()
-            )
+                    return {"files_folders": files_folders, "next": next_cursor}
 
+                # Continue with the files from the start
+                cursor = {"folders": False, "value": None, "id": None}
+
+            limit = page_size - len(files_folders)
+            files = self.files_page(
+                project=project, folder=folder, sort_by=sort_by, after=cursor, limit=limit + 1
+            ).all()
         except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError) as err:
             raise DatabaseError(
                 message=str(err),
-                alt_message=f"Could not get size of folder '{folder_name}'"
+                alt_message=f"Could not get items in {f'folder {folder}' if folder != '.' else 'root'}"
                 + (
                     ": Database malfunction."
                     if isinstance(err, sqlalchemy.exc.OperationalError)
@@ -326,66 +501,176 @@ class ListFiles(flask_restful.Resource):
                 ),
             ) from err
 
-        return file_info.sizeSum
+        for x in files[:limit]:
+            info = {"name": x.name if folder == "." else x.name.split(os.sep)[-1], "folder": False}
+            if show_size:
+                info.update({"size": x.size_original})
+            files_folders.append(info)
+
+        if len(files) > limit and limit > 0:
+            last = files[limit - 1]
+            next_cursor = self.encode_cursor(
+                sort_by=sort_by,
+                folders=False,
+                value=last.name if sort_by == "name" else last.sort_value,
+                row_id=last.id,
+            )
+        elif files and limit == 0:
+            # The page was filled by folders, start with the files on the next page
+            next_cursor = self.encode_cursor(
+                sort_by=sort_by, folders=False, value=None, row_id=None
+            )
+
+        return {"files_folders": files_folders, "next": next_cursor}
+
+    @staticmethod
+    def after_cursor(query, sort_key, id_column, after):
+        """Keep only the rows which are sorted after the cursor."""
+        if after["id"] is None:
+            return query
+
+        return query.filter(
+            sqlalchemy.or_(
+                sort_key > after["value"],
+                sqlalchemy.and_(sort_key == after["value"], id_column > after["id"]),
+            )
+        )
+
+    def folders_page(self, project, folder, sort_by, after, limit):
+        """Query the sorted direct subfolders of a folder, starting after the cursor."""
+        # Folders have no upload time, sort them by name instead
+        sort_key = (
+            models.Folder.total_size
+            if sort_by == "size"
+            else sqlalchemy.func.binary(models.Folder.path)
+        )
+        query = models.Folder.query.filter(
+            sqlalchemy.and_(
+                models.Folder.project_id == project.id,
+                models.Folder.parent_hash == dds_web.utils.sha256_digest(folder),
+            )
+        ).with_entities(models.Folder.id, models.Folder.path, models.Folder.total_size)
+        query = self.after_cursor(
+            query=query, sort_key=sort_key, id_column=models.Folder.id, after=after
+        )
+
+        return query.order_by(sort_key, models.Folder.id).limit(limit)
+
+    def files_page(self, project, folder, sort_by, after, limit):
+        """Query the sorted files in a folder, starting after the cursor."""
+        query = models.File.query.filter(
+            sqlalchemy.and_(
+                models.File.project_id == sqlalchemy.func.binary(project.id),
+                models.File.subpath == sqlalchemy.func.binary(folder),
+            )
+        )
+        sort_key = {
+            "size": models.File.size_original,
+            "time": models.File.time_uploaded,
+        }.get(sort_by, sqlalchemy.func.binary(models.File.name))
+
+        query = query.with_entities(
+            models.File.id,
+            models.File.name,
+            models.File.size_original,
+            sort_key.label("sort_value"),
+        )
+        query = self.after_cursor(
+            query=query, sort_key=sort_key, id_column=models.File.id, after=after
+        )
+
+        return query.order_by(sort_key, models.File.id).limit(limit)
+
+    @staticmethod
+    def encode_cursor(sort_by, folders, value, row_id):
+        """Create the opaque cursor pointing at the last listed item."""
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat()
+
+        cursor = {"sort_by": sort_by, "folders": folders, "value": value, "id": row_id}
+        return base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8")).decode("utf-8")
+
+    @staticmethod
+    def decode_cursor(cursor, sort_by):
+        """Read the cursor sent by the client.
+
+        The cursor is only accepted with exactly the keys and value types created by
+        encode_cursor, since the values are used in the page queries.
+        """
+        try:
+            decoded = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+            if not isinstance(decoded, dict) or set(decoded) != {
+                "sort_by",
+                "folders",
+                "value",
+                "id",
+            }:
+                raise ValueError("Unexpected cursor keys.")
+
+            if decoded["sort_by"] != sort_by:
+                raise DDSArgumentError(
+                    message="The cursor does not match the requested sort order."
+                )
+
+            row_id = decoded["id"]
+            if not isinstance(decoded["folders"], bool) or not (
+                row_id is None or (isinstance(row_id, int) and not isinstance(row_id, bool))
+            ):
+                raise ValueError("Unexpected cursor types.")
+
+            value = decoded["value"]
+            if row_id is None:
+                # Start of the folders or files, nothing to compare with
+                if value is not None:
+                    raise ValueError("Unexpected cursor value.")
+            elif sort_by == "size":
+                if not isinstance(value, int) or isinstance(value, bool):
+                    raise ValueError("Unexpected cursor value.")
+            elif not isinstance(value, str):
+                raise ValueError("Unexpected cursor value.")
+            elif sort_by == "time" and not decoded["folders"]:
+                # Folders are sorted by name also when the files are sorted by time
+                decoded["value"] = datetime.datetime.fromisoformat(value)
+        except (ValueError, TypeError, KeyError, AttributeError) as err:
+            raise DDSArgumentError(message="Invalid cursor.") from err
+
+        return decoded
 
     @staticmethod
     def items_in_subpath(project, folder="."):
-        """Get all items in root folder of project."""
+        """Get all files and direct subfolders in the specified folder of the project.
+
+        The subfolders and their sizes are read from the folders table, which is kept up to date
+        when files are added and removed.
+        """
         distinct_files = []
         distinct_folders = []
-        # Get everything in root:
-        # Files have subpath "." and folders do not have child folders
-        # Get everything in folder:
-        # Files have subpath == folder and folders have child folders (regexp)
         if folder[-1] == "/":
             folder = folder[:-1]
         try:
-            # All files in project
-            files = models.File.query.filter(
-                models.File.project_id == sqlalchemy.func.binary(project.id)
-            )
-
-            # File names in root
+            # File names in folder (or root)
             distinct_files = (
-                files.filter(models.File.subpath == sqlalchemy.func.binary(folder))
+                models.File.query.filter(
+                    sqlalchemy.and_(
+                        models.File.project_id == sqlalchemy.func.binary(project.id),
+                        models.File.subpath == sqlalchemy.func.binary(folder),
+                    )
+                )
                 .with_entities(models.File.name, models.File.size_original)
                 .all()
             )
 
-            # Folder names in folder (or root)
-            if folder == ".":
-                # Get distinct folders in root, subpath should not be "."
-                distinct_folders = (
-                    files.filter(models.File.subpath != sqlalchemy.func.binary(folder))
-                    .with_entities(models.File.subpath)
-                    .distinct()
-                    .all()
-                )
-
-                # Get first subpath (may be many and first may not have files in)
-                first_parts = set(x[0].split(os.sep)[0] for x in distinct_folders)
-                distinct_folders = list(first_parts)
-
-            else:
-                # Get distinct sub folders in specific folder with regex
-                # Match /<something that is not /> x number of times
-                re_folder = re.escape(folder)
-                distinct_folders = (
-                    files.filter(models.File.subpath.regexp_match(rf"^{re_folder}(/[^/]+)+$"))
-                    .with_entities(models.File.subpath)
-                    .distinct()
-                    .all()
-                )
-
-                # Get length of specified folder
-                len_folder = len(folder.split(os.sep))
-
-                # Get subfolders in level under specified folder
-                split_paths = set(
-                    f"{os.sep}".join(x[0].split(os.sep)[: len_folder + 1]) for x in distinct_folders
+            # Folder names and sizes in folder (or root)
+            distinct_folders = (
+                models.Folder.query.filter(
+                    sqlalchemy.and_(
+                        models.Folder.project_id == project.id,
+                        models.Folder.parent_hash == dds_web.utils.sha256_digest(folder),
+                    )
                 )
-                distinct_folders = list(split_paths)
-
+                .with_entities(models.Folder.path, models.Folder.total_size)
+                .all()
+            )
         except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError) as err:
             raise DatabaseError(
                 message=str(err),
@@ -425,95 +710,112 @@ class RemoveFile(flask_restful.Resource):
         # Return deleted and not deleted files
         return {"not_removed": not_removed_dict, "not_exists": not_exist_list}
 
-    def delete_multiple(self, project, files):
-        """Delete multiple files."""
+    def delete_multiple(self, project, files, batch_size: int = 1000):
+        """Delete multiple files.
 
+        The files are looked up together and deleted in batches: one delete_objects request
+        to S3 and one database commit per batch of at most 1000 files (the S3 limit).
+        """
         not_removed_dict, not_exist_list = ({}, [])
 
+        # Get all the files to delete
+        files = list(dict.fromkeys(files))
+        try:
+            found_files = self.get_files_for_deletion(project=project, names=files)
+        except DatabaseError as err:
+            flask.current_app.logger.exception(err)
+            return {x: err.description for x in files}, not_exist_list
+
+        not_exist_list = [x for x in files if x not in found_files]
+        found_files = list(found_files.values())
+
         with ApiS3Connector(project=project) as s3conn:
-            # Delete each file
-            for entry in files:
-                # Delete from db
-                try:
-                    name_in_bucket = self.delete_one(project=project, filename=entry)
-                    if not name_in_bucket:
-                        raise DatabaseError(
-                            message="Remote file name not found.", pass_message=True
-                        )
-                except FileNotFoundError:
-                    db.session.rollback()
-                    not_exist_list.append(entry)
-                    continue
-                except (
-                    sqlalchemy.exc.SQLAlchemyError,
-                    DatabaseError,
-                    sqlalchemy.exc.OperationalError,
-                ) as err:
-                    db.session.rollback()
-                    flask.current_app.logger.exception(err)
-                    not_removed_dict[entry] = (
-                        str(err)
-                        if isinstance(err, DatabaseError)
-                        else (
-                            "Could not collect the remote file name"
-                            + (
-                                ": Database malfunction."
-                                if isinstance(err, sqlalchemy.exc.OperationalError)
-                                else "."
-                            )
-                        )
-                    )
-                    continue
+            for i in range(0, len(found_files), batch_size):
+                batch = found_files[i : i + batch_size]
 
                 # Remove from s3 bucket
                 try:
-                    s3conn.remove_one(file=name_in_bucket)
+                    s3_errors = s3conn.remove_multiple(
+                        items=[x.name_in_bucket for x in batch], batch_size=batch_size
+                    )
                 except (BucketNotFoundError, botocore.client.ClientError) as err:
-                    db.session.rollback()
-                    not_removed_dict[entry] = str(err)
+                    not_removed_dict.update({x.name: str(err) for x in batch})
                     continue
 
-                # Commit to db if ok
+                not_removed_dict.update(
+                    {
+                        x.name: s3_errors[x.name_in_bucket]
+                        for x in batch
+                        if x.name_in_bucket in s3_errors
+                    }
+                )
+                removed = [x for x in batch if x.name_in_bucket not in s3_errors]
+
+                # Delete from db and commit if ok
                 try:
+                    db_tools.delete_files(project=project, files=removed, batch_size=batch_size)
                     db.session.commit()
                 except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError) as err:
                     db.session.rollback()
-                    flask.current_app.logger.exception(err)
-                    not_removed_dict[entry] = "Could not remove data" + (
-                        ": Database malfunction."
-                        if isinstance(err, sqlalchemy.exc.OperationalError)
-                        else "."
+                    flask.current_app.logger.error(
+                        "Files deleted in S3 but not in db. The entries must be synchronised! "
+                        f"Error: {str(err)}"
+                    )
+                    not_removed_dict.update(
+                        {
+                            x.name: "Could not remove data"
+                            + (
+                                ": Database malfunction."
+                                if isinstance(err, sqlalchemy.exc.OperationalError)
+                                else "."
+                            )
+                            for x in removed
+                        }
                     )
-                    continue
 
         return not_removed_dict, not_exist_list
 
-    def delete_one(self, project, filename):
-        """Delete a single file in project."""
-        # Get matching files in project
-        file = models.File.query.filter(
-            models.File.name == sqlalchemy.func.binary(filename),
-            models.File.project_id == sqlalchemy.func.binary(project.id),
-        ).one_or_none()
-
-        if not file:
-            raise FileNotFoundError("Could not find the specified file.")
-
-        name_in_bucket = file.name_in_bucket
-
-        # get current version
-        current_file_version = models.Version.query.filter(
-            sqlalchemy.and_(
-                models.Version.active_file == sqlalchemy.func.binary(file.id),
-                models.Version.time_deleted.is_(None),
-            )
-        ).first()
-        current_file_version.time_deleted = dds_web.utils.current_time()
-
-        db.session.delete(file)
-        project.date_updated = dds_web.utils.current_time()
+    @staticmethod
+    def get_files_for_deletion(project, names, batch_size: int = 1000):
+        """Get the files to delete, by name."""
+        files = {}
+        try:
+            for i in range(0, len(names), batch_size):
+                files.update(
+                    {
+                        x.name: x
+                        for x in models.File.query.filter(
+                            sqlalchemy.and_(
+                                models.File.project_id == sqlalchemy.func.binary(project.id),
+                                models.File.name_sha256.in_(
+                                    [
+                                        dds_web.utils.sha256_digest(x)
+                                        for x in names[i : i + batch_size]
+                                    ]
+                                ),
+                            )
+                        ).with_entities(
+                            models.File.id,
+                            models.File.name,
+                            models.File.name_in_bucket,
+                            models.File.subpath,
+                            models.File.size_original,
+                            models.File.size_stored,
+                        )
+                    }
+                )
+        except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError) as err:
+            raise DatabaseError(
+                message=str(err),
+                alt_message="Could not collect the remote file names"
+                + (
+                    ": Database malfunction."
+                    if isinstance(err, sqlalchemy.exc.OperationalError)
+                    else "."
+                ),
+            ) from err
 
-        return name_in_bucket
+        return files
 
 
 class RemoveDir(flask_restful.Resource):
@@ -552,15 +854,24 @@ class RemoveDir(flask_restful.Resource):
                         entry.name_in_bucket for entry in files[i : i + batch_size]
                     )
                     try:
-                        s3conn.remove_multiple(items=bucket_names, batch_size=batch_size)
+                        s3_errors = s3conn.remove_multiple(
+                            items=bucket_names, batch_size=batch_size
+                        )
                     except botocore.client.ClientError as err:
                         not_removed[folder_name] = str(err)
                         fail_type = "s3"
                         break
 
-                    # Commit to db if no error so far
+                    # Commit to db if no error so far, only for the files removed from s3
                     try:
-                        self.queue_file_entry_deletion(files[i : i + batch_size])
+                        self.queue_file_entry_deletion(
+                            project=project,
+                            files=[
+                                x
+                                for x in files[i : i + batch_size]
+                                if x.name_in_bucket not in s3_errors
+                            ],
+                        )
                         project.date_updated = dds_web.utils.current_time()
                         db.session.commit()
                     except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError) as err:
@@ -577,6 +888,14 @@ class RemoveDir(flask_restful.Resource):
                         fail_type = "db"
                         break
 
+                    if s3_errors:
+                        not_removed[folder_name] = (
+                            f"{len(s3_errors)} files in the folder could not be removed: "
+                            f"{next(iter(s3_errors.values()))}"
+                        )
+                        fail_type = "s3"
+                        break
+
         return {
             "not_removed": not_removed,
             "fail_type": fail_type,
@@ -601,6 +920,13 @@ class RemoveDir(flask_restful.Resource):
                         models.File.subpath.regexp_match(rf"^{re_folder}(/[^/]+)*$"),
                     )
                 )
+                .with_entities(
+                    models.File.id,
+                    models.File.name_in_bucket,
+                    models.File.subpath,
+                    models.File.size_original,
+                    models.File.size_stored,
+                )
                 .all()
             )
         except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError) as err:
@@ -616,18 +942,9 @@ class RemoveDir(flask_restful.Resource):
 
         return files
 
-    def queue_file_entry_deletion(self, files: list):
+    def queue_file_entry_deletion(self, project, files: list):
         """Prepare queries in the db session for deletion of files in the database."""
-        for entry in files:
-            # get current version
-            current_file_version = models.Version.query.filter(
-                sqlalchemy.and_(
-                    models.Version.active_file == sqlalchemy.func.binary(entry.id),
-                    models.Version.time_deleted.is_(None),
-                )
-            ).first()
-            current_file_version.time_deleted = dds_web.utils.current_time()
-            db.session.delete(entry)
+        db_tools.delete_files(project=project, files=files)
 
 
 class FileInfo(flask_restful.Resource):
@@ -646,6 +963,17 @@ class FileInfo(flask_restful.Resource):
         user_role = auth.current_user().role
         check_eligibility_for_download(status=project.current_status, user_role=user_role)
 
+        # Stream the file info line by line if the client asks for it
+        if flask.request.accept_mimetypes.best == "application/x-ndjson":
+            if not isinstance(flask.request.json, list):
+                raise DDSArgumentError(message="A list of file and folder names is required.")
+
+            return ndjson_response(
+                project_schemas.ProjectContentSchema().stream_items(
+                    project=project, requested_items=flask.request.json, url=True
+                )
+            )
+
         # Get project contents
         input_ = {
             "project": project.public_id,
@@ -679,6 +1007,12 @@ class FileInfoAll(flask_restful.Resource):
         user_role = auth.current_user().role
         check_eligibility_for_download(status=project.current_status, user_role=user_role)
 
+        # Stream the file info line by line if the client asks for it
+        if flask.request.accept_mimetypes.best == "application/x-ndjson":
+            return ndjson_response(
+                project_schemas.ProjectContentSchema().stream_items(project=project, url=True)
+            )
+
         files, _, _ = project_schemas.ProjectContentSchema().dump(
             {"project": project.public_id, "get_all": True, "url": True}
         )
@@ -698,6 +1032,11 @@ class UpdateFile(flask_restful.Resource):
         # Verify project ID and access
         project = project_schemas.ProjectRequiredSchema().load(flask.request.args)
 
+        # Update multiple files if a list of file names is sent
+        if isinstance(flask.request.json, list):
+            not_found = self.update_multiple(project=project, file_names=flask.request.json)
+            return {"message": "File info updated.", "not_found": not_found}
+
         # Get file name from request from CLI
         file_name = flask.request.json.get("name")
         if not file_name:
@@ -713,7 +1052,7 @@ class UpdateFile(flask_restful.Resource):
             file = models.File.query.filter(
                 sqlalchemy.and_(
                     models.File.project_id == sqlalchemy.func.binary(project.id),
-                    models.File.name == sqlalchemy.func.binary(file_name),
+                    models.File.name_sha256 == dds_web.utils.sha256_digest(file_name),
                 )
             ).first()
 
@@ -738,3 +1077,48 @@ class UpdateFile(flask_restful.Resource):
             db.session.commit()
 
         return {"message": "File info updated."}
+
+    @staticmethod
+    def update_multiple(project, file_names, batch_size: int = 1000):
+        """Set the download time for multiple files, one UPDATE per batch of names.
+
+        Returns the names of the files which are not in the project.
+        """
+        if not file_names or not all(isinstance(x, str) and x for x in file_names):
+            raise DDSArgumentError("No file names specified. Cannot update files.")
+
+        file_names = list(dict.fromkeys(file_names))
+        timestamp = dds_web.utils.current_time()
+        num_updated = 0
+        try:
+            for i in range(0, len(file_names), batch_size):
+                num_updated += models.File.query.filter(
+                    sqlalchemy.and_(
+                        models.File.project_id == sqlalchemy.func.binary(project.id),
+                        models.File.name_sha256.in_(
+                            [dds_web.utils.sha256_digest(x) for x in file_names[i : i + batch_size]]
+                        ),
+                    )
+                ).update({"time_latest_download": timestamp}, synchronize_session=False)
+
+            # Only look for the missing files if some were not updated
+            not_found = []
+            if num_updated < len(file_names):
+                existing = db_tools.existing_file_names(project=project, names=file_names)
+                not_found = [x for x in file_names if x not in existing]
+
+            db.session.commit()
+        except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError) as err:
+            db.session.rollback()
+            flask.current_app.logger.exception(str(err))
+            raise DatabaseError(
+                message=str(err),
+                alt_message="Update of file info failed"
+                + (
+                    ": Database malfunction."
+                    if isinstance(err, sqlalchemy.exc.OperationalError)
+                    else "."
+                ),
+            ) from err
+
+        return not_found
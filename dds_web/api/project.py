@@ -19,6 +19,7 @@ import marshmallow
 import dds_web.utils
 from dds_web import auth, db
 from dds_web.database import models
+from dds_web.api import db_tools
 from dds_web.api.api_s3_connector import ApiS3Connector
 from dds_web.api.dds_decorators import (
     logging_bind_request,
@@ -433,8 +434,34 @@ class UserProjects(flask_restful.Resource):
             "Unit Personnel",
         ]
 
-        # Get info for all projects
-        for p in current_user.projects:
+        # Get the projects and the per-project information with one query each
+        try:
+            projects = current_user.projects_query.all()
+
+            projects_with_access = {
+                x.project_id
+                for x in models.ProjectUserKeys.query.filter(
+                    models.ProjectUserKeys.user_id == current_user.username
+                ).with_entities(models.ProjectUserKeys.project_id)
+            }
+
+            project_usage = (
+                db_tools.project_byte_hours(current_user.projects_query) if usage else {}
+            )
+        except (sqlalchemy.exc.OperationalError, sqlalchemy.exc.SQLAlchemyError) as err:
+            raise DatabaseError(
+                message=str(err),
+                alt_message=(
+                    "Could not get users project information."
+                    + (
+                        ": Database malfunction."
+                        if isinstance(err, sqlalchemy.exc.OperationalError)
+                        else "."
+                    ),
+                ),
+            ) from err
+
+        for p in projects:
             project_info = {
                 "Project ID": p.public_id,
                 "Title": p.title,
@@ -449,31 +476,14 @@ class UserProjects(flask_restful.Resource):
             project_info["Size"] = proj_size
 
             if usage:
-                proj_bhours, proj_cost = self.project_usage(project=p)
+                proj_bhours = project_usage.get(p.id, 0.0)
+                proj_cost = self.project_cost(bhours=proj_bhours)
                 total_bhours_db += proj_bhours
                 total_cost_db += proj_cost
                 # return ByteHours
                 project_info.update({"Usage": proj_bhours, "Cost": proj_cost})
 
-            try:
-                project_info["Access"] = (
-                    models.ProjectUserKeys.query.filter_by(
-                        project_id=p.id, user_id=current_user.username
-                    ).count()
-                    > 0
-                )
-            except (sqlalchemy.exc.OperationalError, sqlalchemy.exc.SQLAlchemyError) as err:
-                raise DatabaseError(
-                    message=str(err),
-                    alt_message=(
-                        "Could not get users project access information."
-                        + (
-                            ": Database malfunction."
-                            if isinstance(err, sqlalchemy.exc.OperationalError)
-                            else "."
-                        ),
-                    ),
-                ) from err
+            project_info["Access"] = p.id in projects_with_access
 
             all_projects.append(project_info)
 
@@ -492,28 +502,12 @@ class UserProjects(flask_restful.Resource):
         return return_info
 
     @staticmethod
-    def project_usage(project):
-
-        bhours = 0.0
-        cost = 0.0
-
-        for v in project.file_versions:
-            # Calculate hours of the current file
-            time_deleted = v.time_deleted if v.time_deleted else dds_web.utils.current_time()
-            time_uploaded = v.time_uploaded
-
-            file_hours = (time_deleted - time_uploaded).seconds / (60 * 60)
+    def project_cost(bhours):
+        """Calculate the approximate cost of the byte hours stored by a project."""
+        # Calculate approximate cost per gbhour: kr per gb per month / (days * hours)
+        cost_gbhour = 0.09 / (30 * 24)
 
-            # Calculate BHours
-            bhours += v.size_stored * file_hours
-
-            # Calculate approximate cost per gbhour: kr per gb per month / (days * hours)
-            cost_gbhour = 0.09 / (30 * 24)
-
-            # Save file cost to project info and increase total unit cost
-            cost += bhours / 1e9 * cost_gbhour
-
-        return bhours, cost
+        return bhours / 1e9 * cost_gbhour
 
 
 class RemoveContents(flask_restful.Resource):
@@ -534,7 +528,7 @@ class RemoveContents(flask_restful.Resource):
         )
 
         # Check if project contains anything
-        if not project.files:
+        if not project.file_count:
             raise EmptyProjectException(
                 project=project, message="There are no project contents to delete."
             )
@@ -546,17 +540,32 @@ class RemoveContents(flask_restful.Resource):
 
     @staticmethod
     def delete_project_contents(project):
-        """Remove project contents"""
+        """Remove project contents.
+
+        The bucket contents are deleted in parallel batches. The progress is saved after each
+        batch, so that a failed or interrupted deletion continues where it stopped next time.
+        """
         # Delete from cloud
         with ApiS3Connector(project=project) as s3conn:
             try:
-                s3conn.remove_bucket()
+                s3conn.remove_bucket(
+                    start_after=db_tools.bucket_purge_last_key(bucket=project.bucket),
+                    checkpoint=lambda last_key, num_keys: db_tools.save_bucket_purge_progress(
+                        bucket=project.bucket, last_key=last_key, num_deleted=num_keys
+                    ),
+                    max_workers=flask.current_app.config.get("S3_PURGE_WORKERS", 8),
+                )
             except botocore.client.ClientError as err:
                 raise DeletionError(message=str(err), project=project.public_id) from err
+        db_tools.remove_bucket_purge_progress(bucket=project.bucket)
 
         # If ok delete from database
         try:
             models.File.query.filter(models.File.project_id == project.id).delete()
+            models.Folder.query.filter(models.Folder.project_id == project.id).delete()
+            project.file_count = 0
+            project.total_size_original = 0
+            project.total_size_stored = 0
             # TODO: put in class
             project.date_updated = dds_web.utils.current_time()
 
@@ -0,0 +1,131 @@
+"""Per-process caches of S3 resources and bucket existence checks."""
+
+####################################################################################################
+# IMPORTS ################################################################################ IMPORTS #
+####################################################################################################
+
+# Standard library
+import threading
+import time
+
+# Installed
+import boto3
+import botocore.config
+import flask
+
+####################################################################################################
+# GLOBAL VARIABLES ############################################################## GLOBAL VARIABLES #
+####################################################################################################
+
+# boto3 resources are not thread safe, each thread keeps its own
+_local = threading.local()
+
+# Cache usage, for all threads in the process
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+# Buckets which have been verified to exist, with the time the check expires
+_buckets_lock = threading.Lock()
+_verified_buckets = {}
+
+####################################################################################################
+# FUNCTIONS ############################################################################ FUNCTIONS #
+####################################################################################################
+
+
+def _count(stat: str):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def _thread_resources():
+    """Get the resources cached in the current thread."""
+    if not hasattr(_local, "resources"):
+        _local.resources = {}
+
+    return _local.resources
+
+
+def s3_config():
+    """Client config for S3: connection pool size, timeouts and retries."""
+    config = flask.current_app.config
+    return botocore.config.Config(
+        max_pool_connections=config.get("S3_MAX_POOL_CONNECTIONS", 50),
+        connect_timeout=config.get("S3_CONNECT_TIMEOUT", 10),
+        read_timeout=config.get("S3_READ_TIMEOUT", 60),
+        retries={"max_attempts": config.get("S3_MAX_RETRY_ATTEMPTS", 5), "mode": "adaptive"},
+    )
+
+
+def get_resource(endpoint_url: str, access_key: str, secret_key: str):
+    """Get the S3 resource for the unit credentials, reusing its connections if cached.
+
+    The resources are cached per (endpoint, access key). A cached resource is replaced if the
+    secret key has changed.
+    """
+    resources = _thread_resources()
+    cache_key = (endpoint_url, access_key)
+
+    cached = resources.get(cache_key)
+    if cached is not None and cached[0] == secret_key:
+        _count("hits")
+        return cached[1]
+
+    if cached is not None:
+        _count("invalidations")
+    _count("misses")
+
+    session = boto3.session.Session()
+    resource = session.resource(
+        service_name="s3",
+        endpoint_url=endpoint_url,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        config=s3_config(),
+    )
+    resources[cache_key] = (secret_key, resource)
+    flask.current_app.logger.debug("S3 resource cache: %s", cache_stats())
+
+    return resource
+
+
+def invalidate(endpoint_url: str = None, access_key: str = None):
+    """Remove the cached resources for the credentials in this thread, all if not specified."""
+    resources = _thread_resources()
+    for cache_key in list(resources):
+        if endpoint_url in (None, cache_key[0]) and access_key in (None, cache_key[1]):
+            del resources[cache_key]
+            _count("invalidations")
+
+
+def cache_stats():
+    """Get the number of cache hits, misses and invalidations in the process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def bucket_verified(endpoint_url: str, bucket: str):
+    """Check if the bucket has been verified to exist within the TTL."""
+    with _buckets_lock:
+        expires = _verified_buckets.get((endpoint_url, bucket))
+
+    return expires is not None and expires > time.monotonic()
+
+
+def set_bucket_verified(endpoint_url: str, bucket: str):
+    """Remember that the bucket exists, for S3_BUCKET_CHECK_TTL seconds."""
+    ttl = flask.current_app.config.get("S3_BUCKET_CHECK_TTL", 60)
+    with _buckets_lock:
+        _verified_buckets[(endpoint_url, bucket)] = time.monotonic() + ttl
+
+
+def forget_bucket(endpoint_url: str = None, bucket: str = None):
+    """Check that the bucket exists again next time, e.g. when it has been deleted.
+
+    All buckets are forgotten if not specified.
+    """
+    with _buckets_lock:
+        if endpoint_url is None and bucket is None:
+            _verified_buckets.clear()
+        else:
+            _verified_buckets.pop((endpoint_url, bucket), None)
@@ -11,6 +11,7 @@ import sqlalchemy
 # Own modules
 from dds_web.database import models
 import dds_web.utils
+from dds_web.api import db_tools
 from dds_web.api.schemas import project_schemas
 
 ####################################################################################################
@@ -18,8 +19,11 @@ from dds_web.api.schemas import project_schemas
 ####################################################################################################
 
 
-class NewFileSchema(project_schemas.ProjectRequiredSchema):
-    """Validates and creates a new file object."""
+class FileInfoSchema(marshmallow.Schema):
+    """Validates the file information sent when registering new files."""
+
+    class Meta:
+        unknown = marshmallow.EXCLUDE
 
     # Length minimum 1 required, required=True accepts empty string
     name = marshmallow.fields.String(
@@ -101,6 +105,10 @@ class NewFileSchema(project_schemas.ProjectRequiredSchema):
         },
     )
 
+
+class NewFileSchema(project_schemas.ProjectRequiredSchema, FileInfoSchema):
+    """Validates and creates a new file object."""
+
     @marshmallow.validates_schema(skip_on_field_errors=True)
     def verify_file_not_exists(self, data, **kwargs):
         """Check that the file does not match anything already in the database."""
@@ -109,7 +117,7 @@ class NewFileSchema(project_schemas.ProjectRequiredSchema):
         file = (
             models.File.query.filter(
                 sqlalchemy.and_(
-                    models.File.name == sqlalchemy.func.binary(data.get("name")),
+                    models.File.name_sha256 == dds_web.utils.sha256_digest(data.get("name")),
                     models.File.project_id == sqlalchemy.func.binary(project.id),
                 )
             )
@@ -133,10 +141,11 @@ class NewFileSchema(project_schemas.ProjectRequiredSchema):
             salt=data.get("salt"),
             public_key=data.get("public_key"),
             checksum=data.get("checksum"),
+            time_uploaded=dds_web.utils.current_time(),
         )
 
         new_version = models.Version(
-            size_stored=new_file.size_stored, time_uploaded=dds_web.utils.current_time()
+            size_stored=new_file.size_stored, time_uploaded=new_file.time_uploaded
         )
 
         project = data.get("project_row")
@@ -145,4 +154,15 @@ class NewFileSchema(project_schemas.ProjectRequiredSchema):
         project.files.append(new_file)
         new_file.versions.append(new_version)
 
+        # Add the file to the folder tree
+        db_tools.update_folder_tree(
+            project=project, changes=[(new_file.subpath, 1, new_file.size_original)]
+        )
+        db_tools.update_project_totals(
+            project=project,
+            file_count=1,
+            size_original=new_file.size_original,
+            size_stored=new_file.size_stored,
+        )
+
         return new_file
@@ -16,9 +16,10 @@ import sqlalchemy
 
 # Own modules
 from dds_web import errors as ddserr
-from dds_web import auth
+from dds_web import auth, db
 from dds_web.database import models
 from dds_web.api import api_s3_connector
+from dds_web.api import db_tools
 from dds_web.api.schemas import sqlalchemyautoschemas
 from dds_web.api.schemas import custom_fields
 from dds_web.security.project_user_keys import generate_project_key_pair
@@ -46,7 +47,11 @@ def verify_project_exists(spec_proj):
 def verify_project_access(project):
     """Check users access to project."""
 
-    if project not in auth.current_user().projects:
+    # Check for the single project instead of loading all projects of the user
+    has_access = db.session.query(
+        auth.current_user().projects_query.filter(models.Project.id == project.id).exists()
+    ).scalar()
+    if not has_access:
         raise ddserr.AccessDeniedError(
             message="Project access denied.",
             username=auth.current_user().username,
@@ -221,24 +226,84 @@ class ProjectContentSchema(ProjectRequiredSchema):
     url = marshmallow.fields.Boolean(required=False, default=False)
     get_all = marshmallow.fields.Boolean(required=False, default=False)
 
-    def find_contents(self, project, contents):
+    # File info returned for each file
+    file_info_fields = (
+        "name_in_bucket",
+        "subpath",
+        "size_original",
+        "size_stored",
+        "salt",
+        "public_key",
+        "checksum",
+        "compressed",
+    )
+
+    def file_columns(self):
+        """The file columns to load: the name and the info returned for each file."""
+        return [models.File.name, *(getattr(models.File, x) for x in self.file_info_fields)]
 
-        # All contents
-        all_contents_query = models.File.query.filter(
-            models.File.project_id == sqlalchemy.func.binary(project.id)
+    def files_statement(self, project, names=None):
+        """Select the returned columns of the project files, only the named ones if specified."""
+        statement = sqlalchemy.select(*self.file_columns()).where(
+            models.File.project_id == project.id
         )
+        if names is not None:
+            statement = statement.where(
+                models.File.name_sha256.in_([dds_web.utils.sha256_digest(x) for x in names])
+            )
+
+        return statement
+
+    @staticmethod
+    def folders_table(folders):
+        """Temporary table with the requested folders, to find their contents in one query."""
+        return db_tools.temporary_table(
+            "tmp_find_contents",
+            sqlalchemy.Column("folder", sqlalchemy.Text, nullable=False),
+            sqlalchemy.Column("prefix", sqlalchemy.Text, nullable=False),
+            rows=({"folder": x, "prefix": x.rstrip(os.sep)} for x in folders),
+        )
+
+    def folder_contents_statement(self, project, folders_table):
+        """Select the files in all requested folders, together with the requested folder."""
+        return (
+            sqlalchemy.select(folders_table.c.folder, *self.file_columns())
+            .join(
+                folders_table,
+                models.File.subpath.like(sqlalchemy.func.concat(folders_table.c.prefix, "%")),
+            )
+            .where(models.File.project_id == project.id)
+        )
+
+    def find_contents(self, project, contents, batch_size: int = 1000):
+        """Find the requested files and the contents of the requested folders.
+
+        Only the returned columns are loaded. The contents of all folders are found in one query
+        and then grouped per requested folder.
+        """
+        contents = list(dict.fromkeys(contents))
 
         # Get all files
-        files = all_contents_query.filter(models.File.name.in_(contents)).all()
+        files = []
+        for i in range(0, len(contents), batch_size):
+            files.extend(
+                db.session.execute(
+                    self.files_statement(project=project, names=contents[i : i + batch_size])
+                ).all()
+            )
 
         # Get not found paths - may be folders
-        new_paths = set(contents).difference(x.name for x in files)
+        found_names = set(x.name for x in files)
+        new_paths = [x for x in contents if x not in found_names]
 
         # Get all folder contents
-        folder_contents = {
-            x: all_contents_query.filter(models.File.subpath.like(f"{x.rstrip(os.sep)}%")).all()
-            for x in new_paths
-        }
+        folder_contents = {x: [] for x in new_paths}
+        if new_paths:
+            with self.folders_table(folders=new_paths) as folders_table:
+                for row in db.session.execute(
+                    self.folder_contents_statement(project=project, folders_table=folders_table)
+                ):
+                    folder_contents[row.folder].append(row)
 
         # Not found
         not_found = {x: folder_contents.pop(x) for x, y in list(folder_contents.items()) if not y}
@@ -256,7 +321,7 @@ class ProjectContentSchema(ProjectRequiredSchema):
 
         # Check if project has contents
         project_row = verify_project_exists(spec_proj=data.get("project"))
-        if not project_row.files:
+        if not project_row.file_count:
             raise ddserr.EmptyProjectException(project=project_row.public_id)
 
         # Check if specific files have been requested or if requested all contents
@@ -266,7 +331,7 @@ class ProjectContentSchema(ProjectRequiredSchema):
                 project=project_row, contents=requested_items
             )
         elif get_all:
-            files = project_row.files
+            files = db.session.execute(self.files_statement(project=project_row)).all()
         else:
             raise ddserr.DDSArgumentError(message="No items were requested.")
 
@@ -276,31 +341,17 @@ class ProjectContentSchema(ProjectRequiredSchema):
         not_found = {}
 
         # Use file schema to get file info automatically
-        fileschema = sqlalchemyautoschemas.FileSchema(
-            many=False,
-            only=(
-                "name_in_bucket",
-                "subpath",
-                "size_original",
-                "size_stored",
-                "salt",
-                "public_key",
-                "checksum",
-                "compressed",
-            ),
-        )
+        fileschema = sqlalchemyautoschemas.FileSchema(many=False, only=self.file_info_fields)
 
         # Connect to s3
         with api_s3_connector.ApiS3Connector(project=project_row) as s3:
             # Get the info and signed urls for all files
             try:
+                urls = s3.generate_get_urls(keys=[x.name_in_bucket for x in files]) if url else []
                 found_files.update(
                     {
-                        x.name: {
-                            **fileschema.dump(x),
-                            "url": s3.generate_get_url(key=x.name_in_bucket) if url else None,
-                        }
-                        for x in files
+                        x.name: {**fileschema.dump(x), "url": urls[i] if url else None}
+                        for i, x in enumerate(files)
                     }
                 )
 
@@ -310,15 +361,13 @@ class ProjectContentSchema(ProjectRequiredSchema):
                         if x not in found_folder_contents:
                             found_folder_contents[x] = {}
 
+                        urls = (
+                            s3.generate_get_urls(keys=[z.name_in_bucket for z in y]) if url else []
+                        )
                         found_folder_contents[x].update(
                             {
-                                z.name: {
-                                    **fileschema.dump(z),
-                                    "url": s3.generate_get_url(key=z.name_in_bucket)
-                                    if url
-                                    else None,
-                                }
-                                for z in y
+                                z.name: {**fileschema.dump(z), "url": urls[i] if url else None}
+                                for i, z in enumerate(y)
                             }
                         )
             except botocore.client.ClientError as clierr:
@@ -327,3 +376,78 @@ class ProjectContentSchema(ProjectRequiredSchema):
                 )
 
         return found_files, found_folder_contents, not_found
+
+    def stream_items(self, project, requested_items=None, url=False, batch_size=1000):
+        """Yield the project contents as newline-delimited JSON, one file per line.
+
+        The files are fetched with a server-side cursor, so only one batch of rows is kept in
+        memory. Each line has a "type": "file" for requested (or all) files, "folder_content"
+        for files within a requested folder and "not_found" for items which do not exist.
+        """
+        if not project.file_count:
+            raise ddserr.EmptyProjectException(project=project.public_id)
+
+        fileschema = sqlalchemyautoschemas.FileSchema(many=False, only=self.file_info_fields)
+
+        with api_s3_connector.ApiS3Connector(project=project) as s3:
+
+            def file_lines(statement, line_type):
+                """Yield the rows with their json lines, signing the urls one batch at a time."""
+                result = db.session.execute(statement.execution_options(stream_results=True))
+                try:
+                    for batch in result.partitions(batch_size):
+                        urls = (
+                            s3.generate_get_urls(keys=[x.name_in_bucket for x in batch])
+                            if url
+                            else []
+                        )
+                        for i, x in enumerate(batch):
+                            line = {"type": line_type}
+                            if line_type == "folder_content":
+                                line["folder"] = x.folder
+                            line.update(
+                                {
+                                    "name": x.name,
+                                    **fileschema.dump(x),
+                                    "url": urls[i] if url else None,
+                                }
+                            )
+                            yield x, flask.json.dumps(line) + "\n"
+                finally:
+                    result.close()
+
+            try:
+                if requested_items is None:
+                    for _, line in file_lines(self.files_statement(project=project), "file"):
+                        yield line
+                    return
+
+                # Requested files
+                requested_items = list(dict.fromkeys(requested_items))
+                found = set()
+                for i in range(0, len(requested_items), batch_size):
+                    files = self.files_statement(
+                        project=project, names=requested_items[i : i + batch_size]
+                    )
+                    for x, line in file_lines(files, "file"):
+                        found.add(x.name)
+                        yield line
+
+                # Items which are not files may be folders, all looked up in one query
+                folders = [x for x in requested_items if x not in found]
+                found_folders = set()
+                if folders:
+                    with self.folders_table(folders=folders) as folders_table:
+                        folder_contents = self.folder_contents_statement(
+                            project=project, folders_table=folders_table
+                        )
+                        for x, line in file_lines(folder_contents, "folder_content"):
+                            found_folders.add(x.folder)
+                            yield line
+
+                for folder in (x for x in folders if x not in found_folders):
+                    yield flask.json.dumps({"type": "not_found", "name": folder}) + "\n"
+            except botocore.client.ClientError as clierr:
+                raise ddserr.S3ConnectionError(
+                    message=str(clierr), alt_message="Could not generate presigned urls."
+                )
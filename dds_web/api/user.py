@@ -26,6 +26,7 @@ from dds_web.database import models
 import dds_web.utils
 import dds_web.forms
 import dds_web.errors as ddserr
+from dds_web.api import db_tools
 from dds_web.api.schemas import project_schemas, user_schemas, token_schemas
 from dds_web.api.dds_decorators import (
     logging_bind_request,
@@ -1014,43 +1015,36 @@ class ShowUsage(flask_restful.Resource):
         total_gbhours_db = 0.0
         total_cost_db = 0.0
 
+        # Byte hours of all unit projects, summed in the database
+        try:
+            project_byte_hours = db_tools.project_byte_hours(
+                models.Project.query.filter(models.Project.unit_id == unit_info.id)
+            )
+        except (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.OperationalError) as err:
+            flask.current_app.logger.exception(err)
+            raise ddserr.DatabaseError(
+                message=str(err),
+                alt_message=f"Failed to calculate the unit usage."
+                + (
+                    ": Database malfunction."
+                    if isinstance(err, sqlalchemy.exc.OperationalError)
+                    else "."
+                ),
+            ) from err
+
+        # Calculate approximate cost per gbhour: kr per gb per month / (days * hours)
+        cost_gbhour = 0.09 / (30 * 24)
+
         # Project (bucket) specific info
         usage = {}
         for p in unit_info.projects:
+            gb_hours = project_byte_hours.get(p.id, 0.0) / 1e9
+            cost = gb_hours * cost_gbhour
 
-            # Define fields in usage dict
-            usage[p.public_id] = {"gbhours": 0.0, "cost": 0.0}
-
-            for f in p.files:
-                for v in f.versions:
-                    # Calculate hours of the current file
-                    time_uploaded = v.time_uploaded
-                    time_deleted = (
-                        v.time_deleted if v.time_deleted else dds_web.utils.current_time()
-                    )
-                    file_hours = (time_deleted - time_uploaded).seconds / (60 * 60)
-
-                    # Calculate GBHours, if statement to avoid zerodivision exception
-                    gb_hours = ((v.size_stored / 1e9) / file_hours) if file_hours else 0.0
-
-                    # Save file version gbhours to project info and increase total unit sum
-                    usage[p.public_id]["gbhours"] += gb_hours
-                    total_gbhours_db += gb_hours
-
-                    # Calculate approximate cost per gbhour: kr per gb per month / (days * hours)
-                    cost_gbhour = 0.09 / (30 * 24)
-                    cost = gb_hours * cost_gbhour
-
-                    # Save file cost to project info and increase total unit cost
-                    usage[p.public_id]["cost"] += cost
-                    total_cost_db += cost
-
-            usage[p.public_id].update(
-                {
-                    "gbhours": round(usage[p.public_id]["gbhours"], 2),
-                    "cost": round(usage[p.public_id]["cost"], 2),
-                }
-            )
+            # Save project gbhours and cost and increase the unit totals
+            total_gbhours_db += gb_hours
+            total_cost_db += cost
+            usage[p.public_id] = {"gbhours": round(gb_hours, 2), "cost": round(cost, 2)}
 
         return {
             "total_usage": {
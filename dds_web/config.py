@@ -36,6 +36,14 @@ class Config(object):
     DDS_SAFESPRING_ACCESS = os.environ.get("DDS_SAFESPRING_ACCESS", "minio")
     DDS_SAFESPRING_SECRET = os.environ.get("DDS_SAFESPRING_SECRET", "minioPassword")
 
+    # S3 connections, the clients are reused within each process
+    S3_MAX_POOL_CONNECTIONS = 50
+    S3_CONNECT_TIMEOUT = 10
+    S3_READ_TIMEOUT = 60
+    S3_MAX_RETRY_ATTEMPTS = 5
+    S3_BUCKET_CHECK_TTL = 60  # seconds before checking again that a bucket exists
+    S3_PURGE_WORKERS = 8  # threads deleting batches of objects when a bucket is removed
+
     # Use short-lived session cookies:
     PERMANENT_SESSION_LIFETIME = datetime.timedelta(hours=1)
 
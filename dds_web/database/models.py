@@ -222,7 +222,15 @@ class Project(db.Model):
 
     # Table setup
     __tablename__ = "projects"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        db.Index(
+            "ix_projects_unit_id_current_status_current_deadline",
+            "unit_id",
+            "current_status",
+            "current_deadline",
+        ),
+        {"extend_existing": True},
+    )
 
     # Columns
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -243,6 +251,16 @@ class Project(db.Model):
     released = db.Column(db.DateTime(), nullable=True)
     is_active = db.Column(db.Boolean, unique=False, nullable=False, default=True, index=True)
 
+    # Kept up to date by the status changes (see update_current_project_status)
+    current_status = db.Column(db.String(50), unique=False, nullable=True)
+    current_deadline = db.Column(db.DateTime(), nullable=True)
+    has_been_available = db.Column(db.Boolean, unique=False, nullable=False, default=False)
+
+    # Kept up to date by the file changes (see db_tools.update_project_totals)
+    file_count = db.Column(db.BigInteger, unique=False, nullable=False, default=0)
+    total_size_original = db.Column(db.BigInteger, unique=False, nullable=False, default=0)
+    total_size_stored = db.Column(db.BigInteger, unique=False, nullable=False, default=0)
+
     # Foreign keys & relationships
     unit_id = db.Column(db.Integer, db.ForeignKey("units.id", ondelete="RESTRICT"), nullable=True)
     responsible_unit = db.relationship("Unit", back_populates="projects")
@@ -268,39 +286,14 @@ class Project(db.Model):
     project_invite_keys = db.relationship(
         "ProjectInviteKeys", back_populates="project", passive_deletes=True
     )
-
-    @property
-    def current_status(self):
-        """Return the current status of the project"""
-        return max(self.project_statuses, key=lambda x: x.date_created).status
-
-    @property
-    def has_been_available(self):
-        """Return True if the project has ever been in the status Available"""
-        result = False
-        if len([x for x in self.project_statuses if "Available" in x.status]) > 0:
-            result = True
-        return result
+    folders = db.relationship(
+        "Folder", back_populates="project", passive_deletes=True, cascade="all, delete"
+    )
 
     @property
     def times_expired(self):
         return len([x for x in self.project_statuses if "Expired" in x.status])
 
-    @property
-    def current_deadline(self):
-        """Return deadline for statuses that have a deadline"""
-        deadline = None
-        if self.current_status in ["Available", "Expired"]:
-            deadline = max(self.project_statuses, key=lambda x: x.date_created).deadline
-        elif self.current_status in ["In Progress"]:
-            if self.has_been_available:
-                list_available = list(
-                    filter(lambda x: x.status == "Available", self.project_statuses)
-                )
-                latest_available = max(list_available, key=lambda x: x.date_created)
-                deadline = latest_available.deadline
-        return deadline
-
     @property
     def safespring_project(self):
         """Get the safespring project name from responsible unit."""
@@ -309,15 +302,15 @@ class Project(db.Model):
 
     @property
     def size(self):
-        """Calculate size of project."""
+        """Get the stored size of the project."""
 
-        return sum([f.size_stored for f in self.files])
+        return self.total_size_stored
 
     @property
     def num_files(self):
         """Get number of files in project."""
 
-        return len(self.files)
+        return self.file_count
 
     def __str__(self):
         """Called by str(), creates representation of object"""
@@ -330,6 +323,25 @@ class Project(db.Model):
         return f"<Project {self.public_id}>"
 
 
+@sqlalchemy.event.listens_for(Project.project_statuses, "append")
+def update_current_project_status(target, value, initiator):
+    """Listen for the 'append' event on Project.project_statuses and update the current status.
+
+    Statuses are added in chronological order, so the appended status is the current one.
+    """
+    deadline = None
+    if value.status in ["Available", "Expired"]:
+        deadline = value.deadline
+    elif value.status == "In Progress" and target.has_been_available:
+        # Only Available projects can be retracted, keep the deadline of the latest release
+        deadline = target.current_deadline
+
+    target.current_status = value.status
+    target.current_deadline = deadline
+    if value.status == "Available":
+        target.has_been_available = True
+
+
 @sqlalchemy.event.listens_for(Project, "before_update")
 def add_before_project_update(mapper, connection, target):
     """Listen for the 'before_update' event on Project and update certain of its fields"""
@@ -549,6 +561,12 @@ class ResearchUser(User):
 
         return [proj.project for proj in self.project_associations]
 
+    @property
+    def projects_query(self):
+        """Return a query for the projects the user is a member of."""
+
+        return Project.query.join(ProjectUsers).filter(ProjectUsers.user_id == self.username)
+
 
 class UnitUser(User):
     """
@@ -591,6 +609,12 @@ class UnitUser(User):
 
         return self.unit.projects
 
+    @property
+    def projects_query(self):
+        """Return a query for the unit projects."""
+
+        return Project.query.filter(Project.unit_id == self.unit_id)
+
 
 class SuperAdmin(User):
     """
@@ -621,6 +645,12 @@ class SuperAdmin(User):
 
         return Project.query.all()
 
+    @property
+    def projects_query(self):
+        """Return a query for all projects."""
+
+        return Project.query
+
 
 ####################################################################################################
 
@@ -797,7 +827,11 @@ class File(db.Model):
 
     # Table setup
     __tablename__ = "files"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        db.Index("ix_files_project_id_name_sha256", "project_id", "name_sha256"),
+        db.Index("ix_files_project_id_time_uploaded", "project_id", "time_uploaded"),
+        {"extend_existing": True},
+    )
 
     # Columns
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
@@ -811,6 +845,15 @@ class File(db.Model):
 
     # Additional columns
     name = db.Column(db.Text, unique=False, nullable=False)
+    # Digest of the name for indexed lookups, set from the name on insert
+    name_sha256 = db.Column(
+        db.BINARY(32),
+        unique=False,
+        nullable=False,
+        default=lambda context: dds_web.utils.sha256_digest(
+            context.get_current_parameters()["name"]
+        ),
+    )
     name_in_bucket = db.Column(db.Text, unique=False, nullable=False)
     subpath = db.Column(db.Text, unique=False, nullable=False)
     size_original = db.Column(db.BigInteger, unique=False, nullable=False)
@@ -819,6 +862,10 @@ class File(db.Model):
     public_key = db.Column(db.String(64), unique=False, nullable=False)
     salt = db.Column(db.String(32), unique=False, nullable=False)
     checksum = db.Column(db.String(64), unique=False, nullable=False)
+    # Upload time of the current version, for sorting without the versions
+    time_uploaded = db.Column(
+        db.DateTime(), unique=False, nullable=False, default=dds_web.utils.current_time
+    )
     time_latest_download = db.Column(db.DateTime(), unique=False, nullable=True)
 
     # Additional relationships
@@ -830,6 +877,53 @@ class File(db.Model):
         return f"<File {pathlib.Path(self.name).name}>"
 
 
+class Folder(db.Model):
+    """
+    Data model for the folder tree of a project. Keeps track of the number and total size of
+    all files within each folder, including the files in its subfolders.
+
+    The paths are looked up via their SHA-256 digests since the paths themselves cannot be indexed.
+
+    Primary key:
+    - id
+
+    Foreign key(s):
+    - project_id
+    """
+
+    # Table setup
+    __tablename__ = "folders"
+    __table_args__ = (
+        db.Index("ix_folders_project_id_path_hash", "project_id", "path_hash", unique=True),
+        db.Index("ix_folders_project_id_parent_hash", "project_id", "parent_hash"),
+        {"extend_existing": True},
+    )
+
+    # Columns
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+
+    # Foreign keys & relationships
+    project_id = db.Column(
+        db.Integer, db.ForeignKey("projects.id", ondelete="CASCADE"), nullable=False
+    )
+    project = db.relationship("Project", back_populates="folders")
+    # ---
+
+    # Additional columns
+    path = db.Column(db.Text, unique=False, nullable=False)
+    path_hash = db.Column(db.BINARY(32), unique=False, nullable=False)
+    parent = db.Column(db.Text, unique=False, nullable=False)
+    parent_hash = db.Column(db.BINARY(32), unique=False, nullable=False)
+    depth = db.Column(db.Integer, unique=False, nullable=False)
+    file_count = db.Column(db.BigInteger, unique=False, nullable=False, default=0)
+    total_size = db.Column(db.BigInteger, unique=False, nullable=False, default=0)
+
+    def __repr__(self):
+        """Called by print, creates representation of object"""
+
+        return f"<Folder {self.path}>"
+
+
 class Version(db.Model):
     """
     Data model for keeping track of all active and non active files. Used for invoicing.
@@ -844,7 +938,10 @@ class Version(db.Model):
 
     # Table setup
     __tablename__ = "versions"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        db.Index("ix_versions_time_deleted", "time_deleted"),
+        {"extend_existing": True},
+    )
 
     # Columns
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -873,3 +970,103 @@ class Version(db.Model):
         """Called by print, creates representation of object"""
 
         return f"<File Version {self.id}>"
+
+
+class BucketPurge(db.Model):
+    """
+    Data model for the progress of removing all objects in a project bucket, so that an
+    interrupted removal can continue where it stopped.
+
+    Primary key:
+    - bucket
+    """
+
+    # Table setup
+    __tablename__ = "bucketpurges"
+    __table_args__ = {"extend_existing": True}
+
+    # Columns
+    bucket = db.Column(db.String(255), primary_key=True)
+
+    # Additional columns
+    last_key = db.Column(db.Text, unique=False, nullable=True)
+    objects_deleted = db.Column(db.BigInteger, unique=False, nullable=False, default=0)
+    time_started = db.Column(db.DateTime(), unique=False, nullable=False)
+    time_updated = db.Column(db.DateTime(), unique=False, nullable=False)
+
+    def __repr__(self):
+        """Called by print, creates representation of object"""
+
+        return f"<BucketPurge {self.bucket}>"
+
+
+class LostFilesWatermark(db.Model):
+    """
+    Data model for the state of a project when its files were last found to be the same in S3 and
+    in the database. The lost-files check is skipped for a project while the state is unchanged.
+
+    Primary key:
+    - project_id
+
+    Foreign key(s):
+    - project_id
+    """
+
+    # Table setup
+    __tablename__ = "lostfileswatermarks"
+    __table_args__ = {"extend_existing": True}
+
+    # Foreign keys & relationships
+    project_id = db.Column(
+        db.Integer, db.ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True
+    )
+    # ---
+
+    # Additional columns
+    time_checked = db.Column(db.DateTime(), unique=False, nullable=False)
+    project_updated = db.Column(db.DateTime(), unique=False, nullable=True)
+    file_count = db.Column(db.BigInteger, unique=False, nullable=False)
+    total_size_stored = db.Column(db.BigInteger, unique=False, nullable=False)
+    s3_object_count = db.Column(db.BigInteger, unique=False, nullable=True)
+    s3_bytes_used = db.Column(db.BigInteger, unique=False, nullable=True)
+
+    def __repr__(self):
+        """Called by print, creates representation of object"""
+
+        return f"<LostFilesWatermark {self.project_id}>"
+
+
+class UsageDaily(db.Model):
+    """
+    Data model for the byte hours stored by a project per day, rolled up from the versions.
+    The versions are marked as invoiced up to the time which has been added to the rollups.
+
+    Primary key:
+    - project_id
+    - day
+
+    Foreign key(s):
+    - project_id
+    """
+
+    # Table setup
+    __tablename__ = "usage_daily"
+    __table_args__ = (
+        db.Index("ix_usage_daily_day", "day"),
+        {"extend_existing": True},
+    )
+
+    # Foreign keys & relationships
+    project_id = db.Column(
+        db.Integer, db.ForeignKey("projects.id", ondelete="RESTRICT"), primary_key=True
+    )
+    # ---
+
+    # Additional columns
+    day = db.Column(db.Date(), primary_key=True)
+    byte_hours = db.Column(db.Numeric(65, 6), unique=False, nullable=False, default=0)
+
+    def __repr__(self):
+        """Called by print, creates representation of object"""
+
+        return f"<UsageDaily {self.project_id} {self.day}>"
@@ -5,6 +5,93 @@ import flask
 scheduler = flask_apscheduler.APScheduler()
 
 
+def due_project_ids(status: str, deadline, batch_size: int = 1000):
+    """Yield the ids of the active projects with the status and a deadline before the specified.
+
+    The projects are found with the (unit_id, current_status, current_deadline) index, one
+    batch of ids at a time and without locking any rows.
+    """
+    import sqlalchemy
+
+    from dds_web import db
+    from dds_web.database import models
+    from dds_web.utils import keyset_query
+
+    due_projects = (
+        db.session.query(models.Project.id)
+        .join(models.Unit, models.Unit.id == models.Project.unit_id)
+        .filter(
+            sqlalchemy.and_(
+                models.Project.current_status == status,
+                models.Project.current_deadline <= deadline,
+                models.Project.is_active == 1,
+            )
+        )
+    )
+    for project in keyset_query(due_projects, column=models.Project.id, batch_size=batch_size):
+        yield project.id
+
+
+def change_due_projects(status: str, new_status: str, get_status_row, batch_size: int = 1000):
+    """Give the due projects with the status a new status row from get_status_row(project).
+
+    Only the due projects are locked, each one in its own transaction, which is committed as
+    soon as the project has its new status. Projects whose status or deadline changed since
+    they were found are skipped.
+
+    Returns the errors per unit and project.
+    """
+    import sqlalchemy
+
+    from dds_web import db
+    from dds_web.database import models
+    from dds_web.errors import DeletionError
+    from dds_web.utils import current_time
+
+    errors = {}
+    now = current_time()
+    for project_id in due_project_ids(status=status, deadline=now, batch_size=batch_size):
+        project = (
+            db.session.query(models.Project)
+            .filter(
+                sqlalchemy.and_(
+                    models.Project.id == project_id,
+                    models.Project.current_status == status,
+                    models.Project.current_deadline <= now,
+                )
+            )
+            .with_for_update()
+            .one_or_none()
+        )
+        if not project:
+            db.session.rollback()
+            continue
+
+        scheduler.app.logger.debug(
+            "Project: %s has status %s and deadline: %s",
+            project.public_id,
+            project.current_status,
+            project.current_deadline,
+        )
+        unit_name, public_id = (project.responsible_unit.name, project.public_id)
+
+        try:
+            project.project_statuses.append(get_status_row(project))
+            db.session.commit()
+            scheduler.app.logger.debug("Project: %s has status %s now!", public_id, new_status)
+        except (
+            sqlalchemy.exc.OperationalError,
+            sqlalchemy.exc.SQLAlchemyError,
+            DeletionError,
+        ) as err:
+            # Continue with the next project
+            scheduler.app.logger.exception(err)
+            db.session.rollback()
+            errors.setdefault(unit_name, {})[public_id] = str(err)
+
+    return errors
+
+
 @scheduler.task("cron", id="available_to_expired", hour=0, minute=1, misfire_grace_time=3600)
 # @scheduler.task("interval", id="available_to_expired", seconds=15, misfire_grace_time=1)
 def set_available_to_expired():
@@ -12,80 +99,35 @@ def set_available_to_expired():
     import sqlalchemy
 
     from dds_web import db
-    from dds_web.database import models
-    from dds_web.errors import DatabaseError
     from dds_web.api.project import ProjectStatus
-    from dds_web.utils import current_time, page_query
+    from dds_web.utils import current_time
 
     with scheduler.app.app_context():
         expire = ProjectStatus()
 
-        errors = {}
+        def expired_status_row(project):
+            scheduler.app.logger.debug("Handling expiring project")
+            return expire.expire_project(
+                project=project,
+                current_time=current_time(),
+                deadline_in=project.responsible_unit.days_in_expired,
+            )
 
         try:
-            for unit in db.session.query(models.Unit).with_for_update().all():
-                errors[unit.name] = {}
-
-                days_in_expired = unit.days_in_expired
-
-                for project in page_query(
-                    db.session.query(models.Project)
-                    .filter(
-                        sqlalchemy.and_(
-                            models.Project.is_active == 1, models.Project.unit_id == unit.id
-                        )
-                    )
-                    .with_for_update()
-                ):
-
-                    if (
-                        project.current_status == "Available"
-                        and project.current_deadline <= current_time()
-                    ):
-                        scheduler.app.logger.debug("Handling expiring project")
-                        scheduler.app.logger.debug(
-                            "Project: %s has status %s and expires on: %s",
-                            project.public_id,
-                            project.current_status,
-                            project.current_deadline,
-                        )
-                        new_status_row = expire.expire_project(
-                            project=project,
-                            current_time=current_time(),
-                            deadline_in=days_in_expired,
-                        )
-
-                        project.project_statuses.append(new_status_row)
-
-                        try:
-                            db.session.commit()
-                            scheduler.app.logger.debug(
-                                "Project: %s has status Expired now!", project.public_id
-                            )
-                        except (
-                            sqlalchemy.exc.OperationalError,
-                            sqlalchemy.exc.SQLAlchemyError,
-                        ) as err:
-                            flask.current_app.logger.exception(err)
-                            db.session.rollback()
-                            errors[unit.name][project.public_id] = str(err)
-                        continue
-                    else:
-                        scheduler.app.logger.debug(
-                            "Nothing to do for Project: %s", project.public_id
-                        )
+            errors = change_due_projects(
+                status="Available", new_status="Expired", get_status_row=expired_status_row
+            )
         except (sqlalchemy.exc.OperationalError, sqlalchemy.exc.SQLAlchemyError) as err:
             flask.current_app.logger.exception(err)
             db.session.rollback()
             raise
 
         for unit, projects in errors.items():
-            if projects:
-                scheduler.app.logger.error(
-                    f"Following projects of Unit '{unit}' encountered issues during expiration process:"
-                )
-                for proj in errors[unit].keys():
-                    scheduler.app.logger.error(f"Error for project '{proj}': {errors[unit][proj]} ")
+            scheduler.app.logger.error(
+                f"Following projects of Unit '{unit}' encountered issues during expiration process:"
+            )
+            for proj in projects.keys():
+                scheduler.app.logger.error(f"Error for project '{proj}': {projects[proj]} ")
 
 
 @scheduler.task("cron", id="expired_to_archived", hour=0, minute=1, misfire_grace_time=3600)
@@ -96,74 +138,64 @@ def set_expired_to_archived():
 
     import sqlalchemy
     from dds_web import db
-    from dds_web.database import models
-    from dds_web.errors import DatabaseError
-    from dds_web.utils import current_time, page_query
+    from dds_web.utils import current_time
     from dds_web.api.project import ProjectStatus
 
     with scheduler.app.app_context():
 
         archive = ProjectStatus()
-        errors = {}
+
+        def archived_status_row(project):
+            scheduler.app.logger.debug("Handling project to archive")
+            new_status_row, delete_message = archive.archive_project(
+                project=project,
+                current_time=current_time(),
+            )
+            scheduler.app.logger.debug(delete_message.strip())
+            return new_status_row
 
         try:
-            for unit in db.session.query(models.Unit).with_for_update().all():
-                errors[unit.name] = {}
-
-                for project in page_query(
-                    db.session.query(models.Project)
-                    .filter(
-                        sqlalchemy.and_(
-                            models.Project.is_active == 1, models.Project.unit_id == unit.id
-                        )
-                    )
-                    .with_for_update()
-                ):
-
-                    if (
-                        project.current_status == "Expired"
-                        and project.current_deadline <= current_time()
-                    ):
-                        scheduler.app.logger.debug("Handling project to archive")
-                        scheduler.app.logger.debug(
-                            "Project: %s has status %s and expired on: %s",
-                            project.public_id,
-                            project.current_status,
-                            project.current_deadline,
-                        )
-                        new_status_row, delete_message = archive.archive_project(
-                            project=project,
-                            current_time=current_time(),
-                        )
-                        scheduler.app.logger.debug(delete_message.strip())
-                        project.project_statuses.append(new_status_row)
-
-                        try:
-                            db.session.commit()
-                            scheduler.app.logger.debug(
-                                "Project: %s has status Archived now!", project.public_id
-                            )
-                        except (
-                            sqlalchemy.exc.OperationalError,
-                            sqlalchemy.exc.SQLAlchemyError,
-                        ) as err:
-                            scheduler.app.logger.exception(err)
-                            db.session.rollback()
-                            errors[unit.name][project.public_id] = str(err)
-                        continue
-                    else:
-                        scheduler.app.logger.debug(
-                            "Nothing to do for Project: %s", project.public_id
-                        )
+            errors = change_due_projects(
+                status="Expired", new_status="Archived", get_status_row=archived_status_row
+            )
         except (sqlalchemy.exc.OperationalError, sqlalchemy.exc.SQLAlchemyError) as err:
             scheduler.app.logger.exception(err)
             db.session.rollback()
             raise
 
         for unit, projects in errors.items():
-            if projects:
-                scheduler.app.logger.error(
-                    f"Following projects of Unit '{unit}' encountered issues during archival process:"
-                )
-                for proj in errors[unit].keys():
-                    scheduler.app.logger.error(f"Error for project '{proj}': {errors[unit][proj]} ")
+            scheduler.app.logger.error(
+                f"Following projects of Unit '{unit}' encountered issues during archival process:"
+            )
+            for proj in projects.keys():
+                scheduler.app.logger.error(f"Error for project '{proj}': {projects[proj]} ")
+
+
+@scheduler.task("cron", id="rollup_daily_usage", hour=0, minute=30, misfire_grace_time=3600)
+def rollup_daily_usage():
+    """Add the storage usage of the past days to the daily rollups used for invoicing."""
+
+    scheduler.app.logger.debug("Task: Rolling up the daily usage.")
+
+    import datetime
+    import sqlalchemy
+    from dds_web import db
+    from dds_web.api import db_tools
+    from dds_web.utils import current_time
+
+    with scheduler.app.app_context():
+        today = current_time().date()
+        try:
+            # Roll up each day since the last run, one transaction per day
+            day = db_tools.usage_rollup_start(
+                until=datetime.datetime.combine(today, datetime.time())
+            )
+            while day is not None and day < today:
+                db_tools.rollup_usage_day(day=day)
+                db.session.commit()
+                scheduler.app.logger.debug("Usage rolled up for %s", day)
+                day += datetime.timedelta(days=1)
+        except (sqlalchemy.exc.OperationalError, sqlalchemy.exc.SQLAlchemyError) as err:
+            scheduler.app.logger.exception(err)
+            db.session.rollback()
+            raise
@@ -6,6 +6,7 @@
 
 # Standard library
 import datetime
+import hashlib
 import os
 import re
 import urllib.parse
@@ -336,6 +337,11 @@ def timestamp(dts=None, datetime_string=None, ts_format="%Y-%m-%d %H:%M:%S.%f%z"
     return t_s
 
 
+def sha256_digest(value):
+    """Return the binary SHA-256 digest of a string, used for indexed equality lookups."""
+    return hashlib.sha256(value.encode("utf-8")).digest()
+
+
 def rate_limit_from_config():
     return flask.current_app.config.get("TOKEN_ENDPOINT_ACCESS_LIMIT", "10/hour")
 
@@ -353,16 +359,53 @@ def working_directory(path):
         os.chdir(current_path)
 
 
-def page_query(q):
-    offset = 0
+def keyset_query(query, column, batch_size: int = 1000):
+    """Yield the rows of the query in batches, ordered by a unique column.
+
+    Each batch starts after the last value of the column instead of at an offset. Every batch
+    therefore costs the same no matter how far the iteration has come. Rows changed between
+    batches are neither skipped nor repeated. The column must be selected by the query.
+    """
+    query = query.order_by(None).order_by(column)
+    last_value = None
     while True:
-        r = False
-        for elem in q.limit(1000).offset(offset):
-            r = True
-            yield elem
-        offset += 1000
-        if not r:
-            break
+        batch = query if last_value is None else query.filter(column > last_value)
+        rows = batch.limit(batch_size).all()
+        if not rows:
+            return
+
+        yield from rows
+        last_value = getattr(rows[-1], column.key)
+
+
+def sorted_difference(first, second):
+    """Compare two sorted iterables of unique values in a single pass.
+
+    Yields (value, True) for the values only in the first and (value, False) for the values only
+    in the second. Only the current value of each iterable is kept in memory. Raises ValueError
+    if an iterable is not sorted.
+    """
+    missing = object()
+
+    def checked(values):
+        previous = missing
+        for value in values:
+            if previous is not missing and not previous < value:
+                raise ValueError(f"The values are not sorted: '{previous}' before '{value}'.")
+            yield value
+            previous = value
+
+    first, second = (checked(first), checked(second))
+    first_value, second_value = (next(first, missing), next(second, missing))
+    while first_value is not missing or second_value is not missing:
+        if second_value is missing or (first_value is not missing and first_value < second_value):
+            yield first_value, True
+            first_value = next(first, missing)
+        elif first_value is missing or second_value < first_value:
+            yield second_value, False
+            second_value = next(second, missing)
+        else:
+            first_value, second_value = (next(first, missing), next(second, missing))
 
 
 def create_one_time_password_email(user, hotp_value):
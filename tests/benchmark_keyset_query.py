@@ -0,0 +1,82 @@
+"""Compare keyset pagination to LIMIT/OFFSET pagination on a large table.
+
+Run with: python -m tests.benchmark_keyset_query [number of rows]
+"""
+
+# IMPORTS ################################################################################ IMPORTS #
+
+# Standard library
+import sys
+import time
+
+# Installed
+import sqlalchemy
+import sqlalchemy.orm
+
+# Own
+from dds_web.database import models  # dds_web.utils can only be imported after the models
+from dds_web.utils import keyset_query
+
+# BENCHMARK ######################################################################## BENCHMARK #
+
+metadata = sqlalchemy.MetaData()
+rows_table = sqlalchemy.Table(
+    "benchmark_rows",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("name", sqlalchemy.String(100), nullable=False),
+)
+
+
+def offset_query(query, batch_size=1000):
+    """Yield the rows of the query with LIMIT/OFFSET pagination, as the old page_query did."""
+    offset = 0
+    while True:
+        rows = query.limit(batch_size).offset(offset).all()
+        if not rows:
+            return
+
+        yield from rows
+        offset += batch_size
+
+
+def timed(rows, batch_size=1000):
+    """Consume the rows and return the total time and the time of the first and last tenth."""
+    batch_times = []
+    start = last = time.perf_counter()
+    for i, _ in enumerate(rows, start=1):
+        if i % batch_size == 0:
+            now = time.perf_counter()
+            batch_times.append(now - last)
+            last = now
+    total = time.perf_counter() - start
+
+    tenth = max(len(batch_times) // 10, 1)
+    return total, sum(batch_times[:tenth]), sum(batch_times[-tenth:])
+
+
+def main(num_rows=1000000):
+    engine = sqlalchemy.create_engine("sqlite://")
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        for i in range(0, num_rows, 100000):
+            connection.execute(
+                rows_table.insert(),
+                [
+                    {"id": x, "name": f"file_{x}"}
+                    for x in range(i + 1, min(i + 100000, num_rows) + 1)
+                ],
+            )
+
+    session = sqlalchemy.orm.Session(engine)
+    query = session.query(rows_table.c.id, rows_table.c.name)
+
+    print(f"{num_rows} rows, 1000 per batch (total, first tenth, last tenth)")
+    total, first, last = timed(offset_query(query.order_by(rows_table.c.id)))
+    print(f"offset: {total:.2f} s ({first:.2f} s, {last:.2f} s)")
+    total, first, last = timed(keyset_query(query, column=rows_table.c.id))
+    print(f"keyset: {total:.2f} s ({first:.2f} s, {last:.2f} s)")
+
+
+if __name__ == "__main__":
+    main(*(int(x) for x in sys.argv[1:2]))
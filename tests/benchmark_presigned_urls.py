@@ -0,0 +1,39 @@
+"""Compare bulk presigned url generation to one boto3 call per key.
+
+Run with: python -m tests.benchmark_presigned_urls [number of keys]
+"""
+
+# IMPORTS ################################################################################ IMPORTS #
+
+# Standard library
+import sys
+import time
+
+# Own
+from tests.test_s3_presigned_urls import s3_connector
+
+# BENCHMARK ######################################################################## BENCHMARK #
+
+
+def main(num_keys=100000):
+    connector = s3_connector(endpoint_url="https://s3.example.com")
+    keys = [f"{i:06d}/file_{i}.fastq.gz.ddsencrypted" for i in range(num_keys)]
+
+    start = time.perf_counter()
+    boto3_urls = [connector.generate_get_url(key=x) for x in keys]
+    boto3_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bulk_urls = connector.generate_get_urls(keys=keys)
+    bulk_time = time.perf_counter() - start
+
+    # The expiry time may have passed a second boundary during the boto3 loop
+    assert len(bulk_urls) == len(boto3_urls)
+    print(f"{num_keys} keys")
+    print(f"boto3: {boto3_time:.2f} s ({num_keys / boto3_time:.0f} urls/s)")
+    print(f"bulk:  {bulk_time:.2f} s ({num_keys / bulk_time:.0f} urls/s)")
+    print(f"speed-up: {boto3_time / bulk_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(x) for x in sys.argv[1:2]))
@@ -29,6 +29,8 @@ from dds_web.database.models import (
 )
 import dds_web.utils
 from dds_web import create_app, db
+from dds_web.api import db_tools
+from dds_web.api import s3_cache
 from dds_web.security.project_user_keys import (
     generate_project_key_pair,
     share_project_private_key,
@@ -51,6 +53,13 @@ def fill_basic_db(db):
 
     db.session.commit()
 
+    # Files are added directly to the database in the fixtures, so build the folder tree and
+    # the project totals from them
+    for project in projects:
+        db_tools.rebuild_folder_tree(project=project)
+        db_tools.recompute_project_totals(project=project)
+    db.session.commit()
+
     generate_project_key_pair(users[2], units[0].projects[0])
     generate_project_key_pair(users[2], units[0].projects[2])
     generate_project_key_pair(users[2], units[0].projects[4])
@@ -495,5 +504,10 @@ def module_client(setup_database):
 @pytest.fixture()
 def boto3_session():
     """Create a mock boto3 session since no access permissions are in place for testing"""
+    # Resources and buckets are cached per process, make sure that the mock is used
+    s3_cache.invalidate()
+    s3_cache.forget_bucket()
     with unittest.mock.patch.object(boto3.session.Session, "resource") as mock_session:
         yield mock_session
+    s3_cache.invalidate()
+    s3_cache.forget_bucket()
@@ -0,0 +1,362 @@
+# IMPORTS ################################################################################ IMPORTS #
+
+# Standard library
+import json
+import threading
+import time
+import types
+import unittest.mock
+
+# Installed
+import botocore.exceptions
+import pytest
+import sqlalchemy
+
+# Own
+from dds_web import db
+from dds_web.api import db_tools
+from dds_web.database import models
+from tests.test_files_new import project_row
+
+# TOOLS #################################################################################### TOOLS #
+
+
+class NoSuchBucket(botocore.exceptions.ClientError):
+    """Raised when listing a bucket which does not exist."""
+
+    def __init__(self, operation_name):
+        super().__init__(
+            {"Error": {"Code": "NoSuchBucket", "Message": "No such bucket"}}, operation_name
+        )
+
+
+class FakeS3Client:
+    """Buckets in memory with the operations used by the commands. Keys map to their sizes."""
+
+    exceptions = types.SimpleNamespace(NoSuchBucket=NoSuchBucket)
+
+    def __init__(self, buckets, failing_buckets=()):
+        self.buckets = {x: dict(y) for x, y in buckets.items()}
+        self.failing_buckets = set(failing_buckets)
+        self.lock = threading.Lock()
+
+    def check_bucket(self, bucket, operation_name):
+        if bucket in self.failing_buckets:
+            raise botocore.exceptions.ClientError(
+                {"Error": {"Code": "AccessDenied", "Message": "Access Denied"}}, operation_name
+            )
+        if bucket not in self.buckets:
+            raise botocore.exceptions.ClientError(
+                {"Error": {"Code": "404", "Message": "Not Found"}}, operation_name
+            )
+
+    def head_bucket(self, Bucket):
+        self.check_bucket(bucket=Bucket, operation_name="HeadBucket")
+        with self.lock:
+            headers = {
+                "x-rgw-object-count": str(len(self.buckets[Bucket])),
+                "x-rgw-bytes-used": str(sum(self.buckets[Bucket].values())),
+            }
+        return {"ResponseMetadata": {"HTTPHeaders": headers}}
+
+    def head_object(self, Bucket, Key):
+        self.check_bucket(bucket=Bucket, operation_name="HeadObject")
+        if Key not in self.buckets[Bucket]:
+            raise botocore.exceptions.ClientError(
+                {"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject"
+            )
+        return {"ContentLength": self.buckets[Bucket][Key]}
+
+    def get_paginator(self, operation_name):
+        assert operation_name == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket, PaginationConfig):
+        if Bucket not in self.buckets:
+            raise NoSuchBucket(operation_name="ListObjectsV2")
+        self.check_bucket(bucket=Bucket, operation_name="ListObjectsV2")
+
+        with self.lock:
+            keys = sorted(self.buckets[Bucket])
+        page_size = PaginationConfig["PageSize"]
+        for i in range(0, len(keys), page_size):
+            yield {"Contents": [{"Key": x} for x in keys[i : i + page_size]]}
+
+    def delete_objects(self, Bucket, Delete):
+        self.check_bucket(bucket=Bucket, operation_name="DeleteObjects")
+        with self.lock:
+            for x in Delete["Objects"]:
+                self.buckets[Bucket].pop(x["Key"], None)
+        return {}
+
+
+@pytest.fixture
+def s3_client():
+    """Patch the S3 resources of all units to use a fake client, set up by the test."""
+    client = FakeS3Client(buckets={})
+    resource = types.SimpleNamespace(meta=types.SimpleNamespace(client=client))
+    with unittest.mock.patch("dds_web.api.s3_cache.get_resource", return_value=resource):
+        yield client
+
+
+def run_command(client, *args):
+    """Run a flask command of the app used by the test client."""
+    db.session.commit()
+    result = client.application.test_cli_runner().invoke(args=list(args))
+
+    # See the changes made by the command
+    db.session.commit()
+    return result
+
+
+def bucket_keys(project):
+    """Get the names in the bucket of the project files in the database."""
+    return sorted(x.name_in_bucket for x in models.File.query.filter_by(project_id=project.id))
+
+
+def fill_bucket(s3_client, project):
+    """Put all files of the project in its bucket."""
+    s3_client.buckets[project.bucket] = {
+        x.name_in_bucket: x.size_stored for x in models.File.query.filter_by(project_id=project.id)
+    }
+
+
+# LOST FILES ########################################################################## LOST FILES #
+
+
+def test_lost_files_none_lost(client, s3_client):
+    """Nothing is found when the buckets and the database have the same files."""
+    project = project_row(project_id="public_project_id")
+    fill_bucket(s3_client=s3_client, project=project)
+
+    result = run_command(client, "lost-files", "find")
+
+    assert result.exit_code == 0
+
+
+@pytest.mark.parametrize("action_type", ["find", "list"])
+def test_lost_files_list(client, s3_client, action_type):
+    """Lost files are found in both directions, without changing anything."""
+    project = project_row(project_id="public_project_id")
+    fill_bucket(s3_client=s3_client, project=project)
+    only_in_db = bucket_keys(project=project)[0]
+    del s3_client.buckets[project.bucket][only_in_db]
+    s3_client.buckets[project.bucket]["only-in-s3"] = 100
+
+    result = run_command(client, "lost-files", action_type)
+
+    assert result.exit_code == 1
+    assert "only-in-s3" in s3_client.buckets[project.bucket]
+    assert only_in_db in bucket_keys(project=project_row(project_id="public_project_id"))
+
+
+def test_lost_files_delete(client, s3_client):
+    """The files only in S3 are deleted from the bucket and the ones only in the db from it."""
+    project = project_row(project_id="public_project_id")
+    fill_bucket(s3_client=s3_client, project=project)
+    keys = bucket_keys(project=project)
+    del s3_client.buckets[project.bucket][keys[0]]
+    s3_client.buckets[project.bucket]["only-in-s3"] = 100
+
+    result = run_command(client, "lost-files", "delete")
+
+    assert result.exit_code == 0
+    project = project_row(project_id="public_project_id")
+    assert sorted(s3_client.buckets[project.bucket]) == keys[1:]
+    assert bucket_keys(project=project) == keys[1:]
+    assert project.file_count == len(keys) - 1
+
+    # Nothing left to do
+    assert run_command(client, "lost-files", "find").exit_code == 0
+
+
+def test_lost_files_failing_project(client, s3_client):
+    """A project which cannot be checked is reported, and the other projects are checked."""
+    project = project_row(project_id="public_project_id")
+    fill_bucket(s3_client=s3_client, project=project)
+    keys = bucket_keys(project=project)
+    s3_client.buckets[project.bucket]["only-in-s3"] = 100
+
+    failing_project = project_row(project_id="second_public_project_id")
+    s3_client.buckets[failing_project.bucket] = {}
+    s3_client.failing_buckets.add(failing_project.bucket)
+
+    result = run_command(client, "lost-files", "delete")
+
+    assert result.exit_code == 1
+    assert sorted(s3_client.buckets[project.bucket]) == keys
+
+
+def test_lost_files_duplicate_names_in_bucket(client, s3_client):
+    """Files with the same name in the bucket are compared once, not as unsorted values."""
+    project = project_row(project_id="public_project_id")
+    files = models.File.query.filter_by(project_id=project.id).all()
+    files[1].name_in_bucket = files[0].name_in_bucket
+    db.session.commit()
+    fill_bucket(s3_client=s3_client, project=project)
+
+    result = run_command(client, "lost-files", "find")
+
+    assert result.exit_code == 0
+
+
+def test_lost_files_db_unavailable(client, s3_client):
+    """The remaining projects are not checked once the database cannot be reached."""
+    calls = []
+
+    def reconcile(project_id, **kwargs):
+        calls.append(project_id)
+        if len(calls) == 1:
+            raise sqlalchemy.exc.OperationalError("SELECT", {}, Exception("Connection lost"))
+        time.sleep(0.2)
+        return 0, 0, False
+
+    db.session.commit()
+    num_projects = models.Project.query.count()
+    assert num_projects > 2
+    with unittest.mock.patch("dds_web.reconcile_project_files", side_effect=reconcile):
+        result = run_command(client, "lost-files", "find", "--workers", "1")
+
+    assert result.exit_code == 1
+    assert len(calls) <= 2
+
+
+# WATERMARKS ########################################################################## WATERMARKS #
+
+
+def replace_object_in_bucket(s3_client, project):
+    """Replace an object in the bucket with another of the same size, which does not change the
+    bucket statistics."""
+    bucket = s3_client.buckets[project.bucket]
+    key = sorted(bucket)[0]
+    bucket["replaced-object"] = bucket.pop(key)
+
+
+def test_lost_files_unchanged_project_skipped(client, s3_client):
+    """A project without lost files is not listed again while its state is unchanged."""
+    project = project_row(project_id="public_project_id")
+    fill_bucket(s3_client=s3_client, project=project)
+    assert run_command(client, "lost-files", "find").exit_code == 0
+    assert models.LostFilesWatermark.query.get(project.id) is not None
+
+    # Not found since the statistics are the same, the bucket is not listed
+    replace_object_in_bucket(s3_client=s3_client, project=project)
+    assert run_command(client, "lost-files", "find").exit_code == 0
+
+    # Always listed with --full
+    assert run_command(client, "lost-files", "find", "--full").exit_code == 1
+
+
+def test_lost_files_not_skipped_after_upload(client, s3_client):
+    """A new file invalidates the saved state of the project."""
+    project = project_row(project_id="public_project_id")
+    fill_bucket(s3_client=s3_client, project=project)
+    assert run_command(client, "lost-files", "find").exit_code == 0
+
+    replace_object_in_bucket(s3_client=s3_client, project=project)
+    db_tools.insert_files(
+        project=project_row(project_id="public_project_id"),
+        files=[
+            {
+                "name": "new_file",
+                "name_in_bucket": "replaced-object",
+                "subpath": ".",
+                "size": 100,
+                "size_processed": 100,
+                "compressed": False,
+                "salt": "A" * 32,
+                "public_key": "B" * 64,
+                "checksum": "C" * 64,
+            }
+        ],
+    )
+
+    # The object which was replaced is only in the database
+    assert run_command(client, "lost-files", "find").exit_code == 1
+
+
+def test_lost_files_not_skipped_after_delete(client, s3_client):
+    """A deleted file invalidates the saved state of the project."""
+    project = project_row(project_id="public_project_id")
+    fill_bucket(s3_client=s3_client, project=project)
+    assert run_command(client, "lost-files", "find").exit_code == 0
+
+    file = models.File.query.filter_by(project_id=project.id).first()
+    db_tools.delete_files(project=project_row(project_id="public_project_id"), files=[file])
+
+    # The file is left in the bucket
+    assert run_command(client, "lost-files", "find").exit_code == 1
+
+
+def test_lost_files_not_skipped_after_bucket_change(client, s3_client):
+    """A change of the bucket statistics invalidates the saved state of the project."""
+    project = project_row(project_id="public_project_id")
+    fill_bucket(s3_client=s3_client, project=project)
+    assert run_command(client, "lost-files", "find").exit_code == 0
+
+    s3_client.buckets[project.bucket]["only-in-s3"] = 100
+    assert run_command(client, "lost-files", "find").exit_code == 1
+
+
+# UPDATE UPLOADED FILE ###################################################### UPDATE UPLOADED FILE #
+
+
+def log_entry(name, size):
+    """Create the cli log entry of a file which was uploaded but not added to the database."""
+    return {
+        "status": {"upload": {"done": True}, "failed_op": "add_file_db"},
+        "path_remote": f"bucket_{name}",
+        "subpath": ".",
+        "size_raw": size,
+        "size_processed": size // 2,
+        "compressed": False,
+        "public_key": "B" * 64,
+        "salt": "A" * 32,
+        "checksum": "C" * 64,
+    }
+
+
+def test_update_uploaded_file(client, s3_client, tmp_path):
+    """Files in S3 are added, files already in the database and files not in S3 are not."""
+    project = project_row(project_id="public_project_id")
+    fill_bucket(s3_client=s3_client, project=project)
+    file_count = project.file_count
+
+    log = {
+        "new_file": log_entry(name="new_file", size=1000),
+        "not_in_s3": log_entry(name="not_in_s3", size=2000),
+        "filename1": log_entry(name="filename1", size=3000),
+        "not_failed": {**log_entry(name="not_failed", size=4000), "status": {"failed_op": None}},
+    }
+    for name in ["new_file", "filename1", "not_failed"]:
+        s3_client.buckets[project.bucket][log[name]["path_remote"]] = log[name]["size_processed"]
+    log_file = tmp_path / "dds_upload.json"
+    log_file.write_text(json.dumps(log))
+
+    result = run_command(
+        client,
+        "update-uploaded-file",
+        "--project",
+        "public_project_id",
+        "--path-to-log-file",
+        str(log_file),
+    )
+    assert result.exit_code == 0
+
+    # The new file is added with its first version
+    project = project_row(project_id="public_project_id")
+    new_file = models.File.query.filter_by(project_id=project.id, name="new_file").one()
+    assert (new_file.name_in_bucket, new_file.size_original, new_file.size_stored) == (
+        "bucket_new_file",
+        1000,
+        500,
+    )
+    assert new_file.compressed
+    assert [x.size_stored for x in new_file.versions] == [500]
+    assert project.file_count == file_count + 1
+
+    # The other files are not added
+    assert not models.File.query.filter_by(project_id=project.id, name="not_in_s3").count()
+    assert not models.File.query.filter_by(project_id=project.id, name="not_failed").count()
+    existing = models.File.query.filter_by(project_id=project.id, name="filename1").one()
+    assert existing.name_in_bucket == "name_in_bucket_1"
@@ -292,3 +292,79 @@ def test_files_find_all_for_download(client, boto3_session):
             assert f"filename_a{i+1}" in files
             assert f"filename_b{i+1}" in files
         unittest.TestCase().assertDictEqual(expected_output, files)
+
+
+def test_files_download_ndjson(client, boto3_session):
+    """Check that the file info can be streamed as newline-delimited JSON"""
+    # Set status to available
+    response = client.post(
+        tests.DDSEndpoint.PROJECT_STATUS,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["unituser"]).token(client),
+        query_string={"project": "public_project_id"},
+        json={"new_status": "Available"},
+    )
+    assert response.status_code == http.HTTPStatus.OK
+
+    with unittest.mock.patch(
+        "dds_web.api.api_s3_connector.ApiS3Connector.generate_get_url"
+    ) as mock_url:
+        mock_url.return_value = "url"
+        response = client.get(
+            tests.DDSEndpoint.FILE_INFO_ALL,
+            headers={
+                **tests.UserAuth(tests.USER_CREDENTIALS["researchuser"]).token(client),
+                "Accept": "application/x-ndjson",
+            },
+            query_string={"project": "public_project_id"},
+        )
+        assert response.status_code == http.HTTPStatus.OK
+        assert response.mimetype == "application/x-ndjson"
+        lines = [json.loads(x) for x in response.data.decode("utf-8").splitlines()]
+        project = models.Project.query.filter_by(public_id="public_project_id").one_or_none()
+        assert len(lines) == len(project.files)
+        assert all(x["type"] == "file" and x["url"] == "url" for x in lines)
+
+        response = client.get(
+            tests.DDSEndpoint.FILE_INFO,
+            headers={
+                **tests.UserAuth(tests.USER_CREDENTIALS["researchuser"]).token(client),
+                "Accept": "application/x-ndjson",
+            },
+            query_string={"project": "public_project_id"},
+            json=["filename1", "sub/path/to/files", "nonexistent"],
+        )
+        assert response.status_code == http.HTTPStatus.OK
+        lines = [json.loads(x) for x in response.data.decode("utf-8").splitlines()]
+        assert {"type": "not_found", "name": "nonexistent"} in lines
+        files = [x for x in lines if x["type"] == "file"]
+        assert len(files) == 1
+        assert files[0]["name"] == "filename1"
+        assert files[0]["subpath"] == "filename1/subpath"
+        folder_contents = [x for x in lines if x["type"] == "folder_content"]
+        assert len(folder_contents) == 5
+        assert all(x["folder"] == "sub/path/to/files" for x in folder_contents)
+
+
+def test_file_download_update_multiple(client):
+    """Set the download time for multiple files in one request"""
+    response = client.put(
+        tests.DDSEndpoint.FILE_UPDATE,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["researchuser"]).token(client),
+        query_string={"project": "public_project_id"},
+        json=["filename1", "filename2", "nonexistent"],
+    )
+    assert response.status_code == http.HTTPStatus.OK
+    assert response.json == {"message": "File info updated.", "not_found": ["nonexistent"]}
+
+    for name in ["filename1", "filename2"]:
+        file_in_db = models.File.query.filter_by(name=name).first()
+        assert file_in_db.time_latest_download is not None
+
+    response = client.put(
+        tests.DDSEndpoint.FILE_UPDATE,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["researchuser"]).token(client),
+        query_string={"project": "public_project_id"},
+        json=["filename1", ""],
+    )
+    assert response.status_code == http.HTTPStatus.BAD_REQUEST
+    assert "No file names specified." in response.json["message"]
@@ -1,6 +1,8 @@
 # IMPORTS ################################################################################ IMPORTS #
 
 # Standard library
+import base64
+import datetime
 import http
 import json
 
@@ -186,3 +188,139 @@ def test_list_project_with_no_files(client):
     assert response.status_code == http.HTTPStatus.OK
     assert "The project file_testing_project is empty." in response.json["message"]
     assert response.json["num_items"] == 0
+
+
+def test_list_files_paginated(client):
+    """List the folder contents one sorted page at a time."""
+    token = tests.UserAuth(tests.USER_CREDENTIALS["unituser"]).token(client)
+
+    # Folders in root: three folders, two pages
+    response = client.get(
+        tests.DDSEndpoint.LIST_FILES,
+        headers=token,
+        query_string={"project": "public_project_id"},
+        json={"page_size": 2, "sort_by": "name"},
+    )
+    assert response.status_code == http.HTTPStatus.OK
+    assert response.json["files_folders"] == [
+        {"folder": True, "name": "filename1"},
+        {"folder": True, "name": "filename2"},
+    ]
+    assert response.json["next"]
+
+    response = client.get(
+        tests.DDSEndpoint.LIST_FILES,
+        headers=token,
+        query_string={"project": "public_project_id"},
+        json={"page_size": 2, "sort_by": "name", "cursor": response.json["next"]},
+    )
+    assert response.status_code == http.HTTPStatus.OK
+    assert response.json["files_folders"] == [{"folder": True, "name": "sub"}]
+    assert response.json["next"] is None
+
+    # Files in folder: five files, three pages
+    names = []
+    cursor = None
+    for _ in range(3):
+        response = client.get(
+            tests.DDSEndpoint.LIST_FILES,
+            headers=token,
+            query_string={"project": "public_project_id"},
+            json={
+                "subpath": "sub/path/to/files",
+                "page_size": 2,
+                "sort_by": "name",
+                "show_size": True,
+                **({"cursor": cursor} if cursor else {}),
+            },
+        )
+        assert response.status_code == http.HTTPStatus.OK
+        assert all(not x["folder"] and "size" in x for x in response.json["files_folders"])
+        names.extend(x["name"] for x in response.json["files_folders"])
+        cursor = response.json["next"]
+    assert cursor is None
+    assert names == [f"filename_b{i}" for i in range(1, 6)]
+
+
+def test_list_files_paginated_by_time(client):
+    """Files are sorted by the upload time of their current version, also across pages."""
+    token = tests.UserAuth(tests.USER_CREDENTIALS["unituser"]).token(client)
+
+    # Upload times in the reverse order of the names
+    files = (
+        models.File.query.filter_by(subpath="sub/path/to/files").order_by(models.File.name).all()
+    )
+    for i, file in enumerate(files):
+        file.time_uploaded = datetime.datetime(2022, 1, 1) - datetime.timedelta(days=i)
+    db.session.commit()
+
+    names = []
+    cursor = None
+    for _ in range(3):
+        response = client.get(
+            tests.DDSEndpoint.LIST_FILES,
+            headers=token,
+            query_string={"project": "public_project_id"},
+            json={
+                "subpath": "sub/path/to/files",
+                "page_size": 2,
+                "sort_by": "time",
+                **({"cursor": cursor} if cursor else {}),
+            },
+        )
+        assert response.status_code == http.HTTPStatus.OK
+        names.extend(x["name"] for x in response.json["files_folders"])
+        cursor = response.json["next"]
+    assert cursor is None
+    assert names == [f"filename_b{i}" for i in range(5, 0, -1)]
+
+
+def test_list_files_paginated_invalid_arguments(client):
+    """Invalid page sizes, sort keys and cursors are rejected."""
+    token = tests.UserAuth(tests.USER_CREDENTIALS["unituser"]).token(client)
+
+    for extra_args, message in [
+        ({"page_size": 0}, "The page size must be an integer"),
+        ({"sort_by": "colour"}, "Files can only be sorted by"),
+        ({"cursor": "not a cursor"}, "Invalid cursor."),
+    ]:
+        response = client.get(
+            tests.DDSEndpoint.LIST_FILES,
+            headers=token,
+            query_string={"project": "public_project_id"},
+            json=extra_args,
+        )
+        assert response.status_code == http.HTTPStatus.BAD_REQUEST
+        assert message in response.json["message"]
+
+
+def test_list_files_paginated_forged_cursor(client):
+    """Cursors without the keys and value types of a cursor from the server are rejected."""
+    token = tests.UserAuth(tests.USER_CREDENTIALS["unituser"]).token(client)
+
+    for sort_by, cursor in [
+        ("name", {"sort_by": "name", "id": 1}),
+        ("name", "name"),
+        ("name", ["name", True, "a", 1]),
+        ("name", {"sort_by": "name", "folders": True, "value": "a", "id": 1, "extra": 1}),
+        ("name", {"sort_by": "name", "folders": "yes", "value": "a", "id": 1}),
+        ("name", {"sort_by": "name", "folders": False, "value": ["a"], "id": 1}),
+        ("name", {"sort_by": "name", "folders": False, "value": "a", "id": {"a": 1}}),
+        ("size", {"sort_by": "size", "folders": False, "value": "a", "id": 1}),
+        ("time", {"sort_by": "time", "folders": False, "value": "yesterday", "id": 1}),
+        ("time", {"sort_by": "time", "folders": False, "value": 1, "id": 1}),
+    ]:
+        response = client.get(
+            tests.DDSEndpoint.LIST_FILES,
+            headers=token,
+            query_string={"project": "public_project_id"},
+            json={
+                "page_size": 2,
+                "sort_by": sort_by,
+                "cursor": base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8")).decode(
+                    "utf-8"
+                ),
+            },
+        )
+        assert response.status_code == http.HTTPStatus.BAD_REQUEST
+        assert "Invalid cursor." in response.json["message"]
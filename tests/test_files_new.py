@@ -7,6 +7,7 @@ import marshmallow
 
 from dds_web import db
 import dds_web.utils
+from dds_web.api import db_tools
 from dds_web.database import models
 import tests
 
@@ -51,6 +52,20 @@ def project_row(project_id):
     return models.Project.query.filter_by(public_id=project_id).one_or_none()
 
 
+def project_totals(project):
+    """Get the file count and total sizes saved for the project."""
+
+    return tuple(
+        db.session.query(
+            models.Project.file_count,
+            models.Project.total_size_original,
+            models.Project.total_size_stored,
+        )
+        .filter_by(id=project)
+        .one()
+    )
+
+
 # TESTS #################################################################################### TESTS #
 
 
@@ -384,6 +399,10 @@ def test_new_file(client):
     assert response.status_code == http.HTTPStatus.OK
 
     assert file_in_db(test_dict=FIRST_NEW_FILE, project=project_1.id)
+    new_file = models.File.query.filter_by(
+        name=FIRST_NEW_FILE["name"], project_id=project_1.id
+    ).one()
+    assert new_file.name_sha256 == dds_web.utils.sha256_digest(FIRST_NEW_FILE["name"])
 
     # Update file with incomplete info
     updated_file = FIRST_NEW_FILE.copy()
@@ -397,8 +416,19 @@ def test_new_file(client):
     assert response.status_code == http.HTTPStatus.BAD_REQUEST
     assert "Information is missing, cannot add file to database." in response.json["message"]
 
-    # Update with full info
+    # Update without the processed size
     updated_file["size"] = 1200
+    updated_file.pop("size_processed")
+    response = client.put(
+        tests.DDSEndpoint.FILE_NEW,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["unitadmin"]).token(client),
+        query_string={"project": "file_testing_project"},
+        json=updated_file,
+    )
+    assert response.status_code == http.HTTPStatus.BAD_REQUEST
+    assert "Information is missing, cannot add file to database." in response.json["message"]
+
+    # Update with full info
     updated_file["size_processed"] = 600
 
     response = client.put(
@@ -465,12 +495,44 @@ def test_match_file_endpoint(client):
     assert response.json["files"] is None
 
 
+def test_match_multiple_files(client):
+    """Only the exactly matching files are returned."""
+
+    new_files = []
+    for i in range(3):
+        new_file = FIRST_NEW_FILE.copy()
+        new_file["name"] = f"match_file_{i}"
+        new_file["name_in_bucket"] = f"match_file_bucket_{i}"
+        new_files.append(new_file)
+
+    response = client.post(
+        tests.DDSEndpoint.FILE_NEW,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["unitadmin"]).token(client),
+        query_string={"project": "file_testing_project"},
+        json=new_files,
+    )
+    assert response.status_code == http.HTTPStatus.OK
+
+    response = client.get(
+        tests.DDSEndpoint.FILE_MATCH,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["unitadmin"]).token(client),
+        query_string={"project": "file_testing_project"},
+        json=["match_file_0", "match_file_2", "MATCH_FILE_1", "non_existent_file"],
+    )
+    assert response.status_code == http.HTTPStatus.OK
+    assert response.json["files"] == {
+        "match_file_0": "match_file_bucket_0",
+        "match_file_2": "match_file_bucket_2",
+    }
+
+
 def test_upload_and_delete_file(client, boto3_session):
     """Upload and delete a file"""
 
     project_1 = project_row(project_id="file_testing_project")
     assert project_1
     assert project_1.current_status == "In Progress"
+    totals_before = project_totals(project=project_1.id)
 
     response = client.post(
         tests.DDSEndpoint.FILE_NEW,
@@ -480,6 +542,11 @@ def test_upload_and_delete_file(client, boto3_session):
     )
     assert response.status_code == http.HTTPStatus.OK
     assert file_in_db(test_dict=FIRST_NEW_FILE, project=project_1.id)
+    assert project_totals(project=project_1.id) == (
+        totals_before[0] + 1,
+        totals_before[1] + FIRST_NEW_FILE["size"],
+        totals_before[2] + FIRST_NEW_FILE["size_processed"],
+    )
 
     response = client.delete(
         tests.DDSEndpoint.REMOVE_FILE,
@@ -490,6 +557,7 @@ def test_upload_and_delete_file(client, boto3_session):
     assert response.status_code == http.HTTPStatus.OK
     assert not response.json["not_removed"]
     assert not file_in_db(test_dict=FIRST_NEW_FILE, project=project_1.id)
+    assert project_totals(project=project_1.id) == totals_before
 
 
 def test_upload_and_delete_folder(client, boto3_session):
@@ -523,6 +591,14 @@ def test_upload_and_delete_folder(client, boto3_session):
     assert response.status_code == http.HTTPStatus.OK
     assert file_in_db(test_dict=file_2_in_folder, project=project_1.id)
 
+    # The folder should keep track of the number of files and their size
+    folder = models.Folder.query.filter_by(
+        project_id=project_1.id, path=file_1_in_folder["subpath"]
+    ).one_or_none()
+    assert folder
+    assert folder.file_count == 2
+    assert folder.total_size == file_1_in_folder["size"] + file_2_in_folder["size"]
+
     # Remove invalid folder
     response = client.delete(
         tests.DDSEndpoint.REMOVE_FOLDER,
@@ -544,6 +620,51 @@ def test_upload_and_delete_folder(client, boto3_session):
     assert not response.json["not_removed"]
     assert not file_in_db(test_dict=file_1_in_folder, project=project_1.id)
     assert not file_in_db(test_dict=file_2_in_folder, project=project_1.id)
+    assert not models.Folder.query.filter_by(
+        project_id=project_1.id, path=file_1_in_folder["subpath"]
+    ).one_or_none()
+
+
+def test_delete_folder_versions(client, boto3_session):
+    """Deleting a folder deletes its files and marks all their versions as deleted, the versions
+    of the other files are not changed."""
+    project = project_row(project_id="public_project_id")
+    folder_files = models.File.query.filter_by(
+        project_id=project.id, subpath="sub/path/to/files"
+    ).all()
+    assert len(folder_files) > 1
+    folder_file_ids = [x.id for x in folder_files]
+    folder_version_ids = [
+        x.id for x in models.Version.query.filter(models.Version.active_file.in_(folder_file_ids))
+    ]
+    assert len(folder_version_ids) > len(folder_file_ids)
+    other_version_ids = [
+        x.id
+        for x in models.Version.query.filter(
+            models.Version.project_id == project.id,
+            models.Version.active_file.notin_(folder_file_ids),
+        )
+    ]
+    assert other_version_ids
+
+    response = client.delete(
+        tests.DDSEndpoint.REMOVE_FOLDER,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["unitadmin"]).token(client),
+        query_string={"project": "public_project_id"},
+        json=["sub/path/to/files"],
+    )
+    assert response.status_code == http.HTTPStatus.OK
+    assert not response.json["not_removed"]
+    assert response.json["nr_deleted"] == len(folder_file_ids)
+
+    assert not models.File.query.filter(models.File.id.in_(folder_file_ids)).count()
+    folder_versions = models.Version.query.filter(models.Version.id.in_(folder_version_ids)).all()
+    assert len(folder_versions) == len(folder_version_ids)
+    assert all(x.time_deleted is not None for x in folder_versions)
+    assert all(x.active_file is None for x in folder_versions)
+
+    other_versions = models.Version.query.filter(models.Version.id.in_(other_version_ids)).all()
+    assert all(x.time_deleted is None and x.active_file is not None for x in other_versions)
 
 
 def test_upload_move_available_delete_file(client, boto3_session):
@@ -847,3 +968,143 @@ def test_new_file_wrong_status(client):
 
     assert response.status_code == http.HTTPStatus.BAD_REQUEST
     assert "Project not in right status to upload/modify files" in response.json.get("message")
+
+
+def test_new_files_multiple(client):
+    """Add multiple files in one request."""
+
+    project_1 = project_row(project_id="file_testing_project")
+    assert project_1
+
+    new_files = []
+    for i in range(5):
+        new_file = FIRST_NEW_FILE.copy()
+        new_file["name"] = f"multiple_file_{i}"
+        new_file["name_in_bucket"] = f"multiple_file_bucket_{i}"
+        new_files.append(new_file)
+
+    response = client.post(
+        tests.DDSEndpoint.FILE_NEW,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["unitadmin"]).token(client),
+        query_string={"project": "file_testing_project"},
+        json=new_files,
+    )
+    assert response.status_code == http.HTTPStatus.OK
+    assert response.json == {"not_added": {}, "already_exists": []}
+
+    for new_file in new_files:
+        assert file_in_db(test_dict=new_file, project=project_1.id)
+        file_row = models.File.query.filter_by(
+            name=new_file["name"], project_id=project_1.id
+        ).one_or_none()
+        assert len(file_row.versions) == 1
+        assert file_row.versions[0].size_stored == new_file["size_processed"]
+        assert file_row.versions[0].time_deleted is None
+
+
+def test_insert_files_versions(client):
+    """Each version is connected to its own file, and nothing changes without files."""
+
+    project_1 = project_row(project_id="file_testing_project")
+    date_updated = project_1.date_updated
+
+    db_tools.insert_files(project=project_1, files=[])
+    db.session.commit()
+    project_1 = project_row(project_id="file_testing_project")
+    assert project_1.date_updated == date_updated
+    assert project_1.file_count == 0
+
+    new_files = []
+    for i in range(5):
+        new_file = FIRST_NEW_FILE.copy()
+        new_file["name"] = f"inserted_file_{i}"
+        new_file["name_in_bucket"] = f"inserted_file_bucket_{i}"
+        new_file["size_processed"] = 100 + i
+        new_files.append(new_file)
+
+    db_tools.insert_files(project=project_1, files=new_files, batch_size=2)
+    db.session.commit()
+
+    for new_file in new_files:
+        file_row = models.File.query.filter_by(name=new_file["name"], project_id=project_1.id).one()
+        assert [(x.active_file, x.size_stored) for x in file_row.versions] == [
+            (file_row.id, new_file["size_processed"])
+        ]
+    assert project_row(project_id="file_testing_project").file_count == 5
+
+
+def test_new_files_multiple_partial_failure(client):
+    """Existing, duplicated and invalid files are reported and the rest are added."""
+
+    project_1 = project_row(project_id="file_testing_project")
+    assert project_1
+
+    response = client.post(
+        tests.DDSEndpoint.FILE_NEW,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["unitadmin"]).token(client),
+        query_string={"project": "file_testing_project"},
+        json=FIRST_NEW_FILE,
+    )
+    assert response.status_code == http.HTTPStatus.OK
+
+    ok_file = FIRST_NEW_FILE.copy()
+    ok_file["name"] = "ok_file"
+    ok_file["name_in_bucket"] = "ok_file_bucket"
+    invalid_file = FIRST_NEW_FILE.copy()
+    invalid_file["name"] = "invalid_file"
+    invalid_file["checksum"] = "test"
+    duplicated_file = FIRST_NEW_FILE.copy()
+    duplicated_file["name"] = "duplicated_file"
+
+    response = client.post(
+        tests.DDSEndpoint.FILE_NEW,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["unitadmin"]).token(client),
+        query_string={"project": "file_testing_project"},
+        json=[FIRST_NEW_FILE, ok_file, invalid_file, duplicated_file, duplicated_file],
+    )
+    assert response.status_code == http.HTTPStatus.OK
+    assert response.json["already_exists"] == [FIRST_NEW_FILE["name"]]
+    assert set(response.json["not_added"]) == {"invalid_file", "duplicated_file"}
+    assert "checksum" in response.json["not_added"]["invalid_file"]
+
+    assert file_in_db(test_dict=ok_file, project=project_1.id)
+    assert not file_in_db(test_dict=invalid_file, project=project_1.id)
+    assert not file_in_db(test_dict=duplicated_file, project=project_1.id)
+
+
+def test_upload_and_delete_multiple_files(client, boto3_session):
+    """Delete multiple files in one request, reporting the ones which do not exist."""
+
+    project_1 = project_row(project_id="file_testing_project")
+    assert project_1
+
+    new_files = []
+    for i in range(3):
+        new_file = FIRST_NEW_FILE.copy()
+        new_file["name"] = f"file_to_delete_{i}"
+        new_file["name_in_bucket"] = f"file_to_delete_bucket_{i}"
+        new_files.append(new_file)
+
+    response = client.post(
+        tests.DDSEndpoint.FILE_NEW,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["unitadmin"]).token(client),
+        query_string={"project": "file_testing_project"},
+        json=new_files,
+    )
+    assert response.status_code == http.HTTPStatus.OK
+
+    response = client.delete(
+        tests.DDSEndpoint.REMOVE_FILE,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["unitadmin"]).token(client),
+        query_string={"project": "file_testing_project"},
+        json=[x["name"] for x in new_files] + ["nonexistent_file"],
+    )
+    assert response.status_code == http.HTTPStatus.OK
+    assert response.json == {"not_removed": {}, "not_exists": ["nonexistent_file"]}
+    for new_file in new_files:
+        assert not file_in_db(test_dict=new_file, project=project_1.id)
+
+    # The versions are kept, marked as deleted
+    versions = models.Version.query.filter_by(project_id=project_1.id).all()
+    assert len(versions) == len(new_files)
+    assert all(x.time_deleted is not None and x.active_file is None for x in versions)
@@ -0,0 +1,69 @@
+# IMPORTS ################################################################################ IMPORTS #
+
+# Installed
+import sqlalchemy
+import sqlalchemy.orm
+
+# Own
+from dds_web.database import models  # dds_web.utils can only be imported after the models
+from dds_web.utils import keyset_query
+
+# TOOLS #################################################################################### TOOLS #
+
+metadata = sqlalchemy.MetaData()
+rows_table = sqlalchemy.Table(
+    "keyset_rows",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("name", sqlalchemy.String(100), nullable=False),
+)
+
+
+def session_with_rows(ids):
+    """Create an in-memory database with one row per id."""
+    engine = sqlalchemy.create_engine("sqlite://")
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(rows_table.insert(), [{"id": x, "name": f"row_{x}"} for x in ids])
+
+    return sqlalchemy.orm.Session(engine)
+
+
+# TESTS #################################################################################### TESTS #
+
+
+def test_keyset_query_all_rows_in_order():
+    """All rows are returned once, ordered by the column, whatever the batch size."""
+    session = session_with_rows(ids=[5, 3, 9, 1, 7, 2])
+    query = session.query(rows_table.c.id, rows_table.c.name).order_by(rows_table.c.name.desc())
+
+    for batch_size in [1, 2, 4, 6, 100]:
+        rows = list(keyset_query(query, column=rows_table.c.id, batch_size=batch_size))
+        assert [x.id for x in rows] == [1, 2, 3, 5, 7, 9]
+
+
+def test_keyset_query_filtered():
+    """The filters of the query are kept for every batch."""
+    session = session_with_rows(ids=range(1, 11))
+    query = session.query(rows_table.c.id).filter(rows_table.c.id % 2 == 0)
+
+    assert [x.id for x in keyset_query(query, column=rows_table.c.id, batch_size=2)] == [
+        2,
+        4,
+        6,
+        8,
+        10,
+    ]
+
+
+def test_keyset_query_rows_removed_during_iteration():
+    """Removing rows which have been returned does not skip any of the remaining rows."""
+    session = session_with_rows(ids=range(1, 11))
+    query = session.query(rows_table.c.id)
+
+    returned = []
+    for row in keyset_query(query, column=rows_table.c.id, batch_size=3):
+        returned.append(row.id)
+        session.execute(rows_table.delete().where(rows_table.c.id == row.id))
+
+    assert returned == list(range(1, 11))
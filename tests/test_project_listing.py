@@ -10,6 +10,7 @@ import unittest
 # Own
 from dds_web.database import models
 import tests
+from tests.test_user_info import add_deleted_file_versions, expected_byte_hours
 
 
 # CONFIG ################################################################################## CONFIG #
@@ -60,6 +61,32 @@ def test_list_proj_unit_user(client):
     assert "Usage" in public_project.keys() and public_project["Usage"] is not None
 
 
+def test_list_proj_usage_values(client):
+    """The usage of each project is the exact byte hours of all versions, also of deleted files."""
+    add_deleted_file_versions(project_id="file_testing_project")
+    public_project_byte_hours = expected_byte_hours(project_id="public_project_id")
+
+    token = tests.UserAuth(tests.USER_CREDENTIALS["unitadmin"]).token(client)
+    response = client.get(
+        tests.DDSEndpoint.LIST_PROJ,
+        headers=token,
+        json={"usage": True},
+        content_type="application/json",
+    )
+    assert response.status_code == http.HTTPStatus.OK
+
+    projects = {x["Project ID"]: x for x in response.json["project_info"]}
+    assert projects["file_testing_project"]["Usage"] == pytest.approx(1.25e13)
+    # Cost per GB hour: 0.09 kr per GB and 30 day month
+    assert projects["file_testing_project"]["Cost"] == pytest.approx(12500 * 0.09 / (30 * 24))
+    assert projects["public_project_id"]["Usage"] == pytest.approx(
+        public_project_byte_hours, rel=1e-3
+    )
+    assert response.json["total_usage"]["usage"] == pytest.approx(
+        1.25e13 + public_project_byte_hours, rel=1e-3
+    )
+
+
 def test_proj_private_successful(client):
     """Successfully get the private key"""
 
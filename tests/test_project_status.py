@@ -14,6 +14,7 @@ import flask_mail
 
 # Own
 import dds_web
+from dds_web.api import s3_cache
 import tests
 from tests.test_files_new import project_row, file_in_db, FIRST_NEW_FILE
 from tests.test_project_creation import proj_data_with_existing_users, create_unit_admins
@@ -43,6 +44,9 @@ fields_set_to_null = [
 @pytest.fixture(scope="module")
 def test_project(module_client):
     """Create a shared test project"""
+    # Resources and buckets are cached per process, make sure that the mock is used
+    s3_cache.invalidate()
+    s3_cache.forget_bucket()
     with unittest.mock.patch.object(boto3.session.Session, "resource") as mock_session:
         response = module_client.post(
             tests.DDSEndpoint.PROJECT_CREATE,
@@ -50,6 +54,8 @@ def test_project(module_client):
             json=proj_data,
         )
         project_id = response.json.get("project_id")
+    s3_cache.invalidate()
+    s3_cache.forget_bucket()
     # add a file
     response = module_client.post(
         tests.DDSEndpoint.FILE_NEW,
@@ -484,6 +490,8 @@ def test_check_deadline_remains_same_when_made_available_again_after_going_to_in
     )
     assert response.status_code == http.HTTPStatus.OK
     assert project.current_status == "In Progress"
+    assert project.current_deadline == deadline_initial
+    assert project.has_been_available
     time.sleep(1)
 
     # Try to delete the project
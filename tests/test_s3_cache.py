@@ -0,0 +1,74 @@
+# IMPORTS ################################################################################ IMPORTS #
+
+# Installed
+import botocore
+import pytest
+
+# Own
+from dds_web.api import s3_cache
+from dds_web.api.api_s3_connector import ApiS3Connector
+from dds_web.database import models
+from dds_web.errors import BucketNotFoundError
+
+# TESTS #################################################################################### TESTS #
+
+
+def test_s3_resource_reused(client, boto3_session):
+    """The S3 resource should only be created once for the same unit credentials."""
+    project = models.Project.query.filter_by(public_id="public_project_id").one_or_none()
+    stats_before = s3_cache.cache_stats()
+
+    with ApiS3Connector(project=project) as first:
+        pass
+    with ApiS3Connector(project=project) as second:
+        pass
+
+    assert first.resource is second.resource
+    assert boto3_session.call_count == 1
+    stats_after = s3_cache.cache_stats()
+    assert stats_after["misses"] == stats_before["misses"] + 1
+    assert stats_after["hits"] == stats_before["hits"] + 1
+
+
+def test_s3_resource_replaced_on_new_secret(client, boto3_session):
+    """A cached resource should not be used after the credentials have changed."""
+    project = models.Project.query.filter_by(public_id="public_project_id").one_or_none()
+
+    with ApiS3Connector(project=project):
+        pass
+
+    project.responsible_unit.safespring_secret = "new_secret"
+    with ApiS3Connector(project=project):
+        pass
+
+    assert boto3_session.call_count == 2
+    assert boto3_session.call_args.kwargs["aws_secret_access_key"] == "new_secret"
+
+
+def test_bucket_checked_once(client, boto3_session):
+    """The bucket should only be checked once, until it is found to be missing."""
+    project = models.Project.query.filter_by(public_id="public_project_id").one_or_none()
+
+    with ApiS3Connector(project=project) as s3conn:
+        s3conn.remove_one(file="file1")
+        s3conn.remove_one(file="file2")
+    with ApiS3Connector(project=project) as s3conn:
+        s3conn.remove_multiple(items=["file3", "file4"])
+
+    head_bucket = boto3_session.return_value.meta.client.head_bucket
+    assert head_bucket.call_count == 1
+
+    # The bucket is checked again after it has been reported missing
+    delete_object = boto3_session.return_value.meta.client.delete_object
+    delete_object.side_effect = botocore.client.ClientError(
+        {"Error": {"Code": "NoSuchBucket", "Message": "The bucket does not exist"}},
+        "DeleteObject",
+    )
+    with ApiS3Connector(project=project) as s3conn:
+        with pytest.raises(BucketNotFoundError):
+            s3conn.remove_one(file="file5")
+
+        delete_object.side_effect = None
+        s3conn.remove_one(file="file5")
+
+    assert head_bucket.call_count == 2
@@ -0,0 +1,56 @@
+# IMPORTS ################################################################################ IMPORTS #
+
+# Standard library
+import types
+import unittest
+
+# Installed
+import boto3
+
+# Own
+from dds_web.api.api_s3_connector import ApiS3Connector
+
+# CONFIG ################################################################################## CONFIG #
+
+KEYS = ["file.txt", "sub/folder/file name.txt", "ü~+=&?#%.gz", "a//b", "  "]
+
+# TOOLS #################################################################################### TOOLS #
+
+
+def s3_connector(endpoint_url, access_key="accesskey/+", secret_key="secretkey"):
+    """Set up a connector without database, signing is done locally."""
+    connector = ApiS3Connector(project=types.SimpleNamespace(bucket="dds-test-bucket"))
+    connector.keys = {"access_key": access_key, "secret_key": secret_key}
+    connector.resource = boto3.session.Session().resource(
+        service_name="s3",
+        endpoint_url=endpoint_url,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+    )
+    return connector
+
+
+# TESTS #################################################################################### TESTS #
+
+
+def test_generate_get_urls_identical_to_boto3():
+    """The locally signed urls should be identical to the ones generated by boto3."""
+    for endpoint_url in ["https://s3.example.com", "http://localhost:9000/prefix/"]:
+        connector = s3_connector(endpoint_url=endpoint_url)
+
+        # Same expiry time for all urls
+        with unittest.mock.patch("time.time", return_value=1648000000.5):
+            urls = connector.generate_get_urls(keys=KEYS)
+            assert connector.query_string_signer(key=KEYS[0], url=urls[0]) is not None
+            assert urls == [connector.generate_get_url(key=x) for x in KEYS]
+
+
+def test_generate_get_urls_falls_back_to_boto3():
+    """Each url is generated by boto3 if the boto3 urls cannot be reproduced."""
+    connector = s3_connector(endpoint_url="https://s3.example.com")
+    with unittest.mock.patch.object(
+        ApiS3Connector, "generate_get_url", side_effect=lambda key, expires_in: f"url/{key}"
+    ):
+        assert connector.generate_get_urls(keys=KEYS) == [f"url/{x}" for x in KEYS]
+
+    assert connector.generate_get_urls(keys=[]) == []
@@ -0,0 +1,175 @@
+# IMPORTS ################################################################################ IMPORTS #
+
+# Standard library
+import threading
+import types
+
+# Installed
+import botocore.exceptions
+import botocore.stub
+import pytest
+
+# Own
+from dds_web.api.api_s3_connector import ApiS3Connector
+from tests.test_s3_presigned_urls import s3_connector as boto3_s3_connector
+
+# TOOLS #################################################################################### TOOLS #
+
+
+class FakeS3Client:
+    """Bucket contents in memory, listed in key order like list_objects_v2."""
+
+    def __init__(self, keys, failing_keys=()):
+        self.keys = sorted(keys)
+        self.failing_keys = set(failing_keys)
+        self.deleted = set()
+        self.delete_requests = []
+        self.bucket_deleted = False
+        self.lock = threading.Lock()
+
+    def upload(self, key):
+        with self.lock:
+            self.keys = sorted([*self.keys, key])
+            self.deleted.discard(key)
+
+    def get_paginator(self, operation_name):
+        assert operation_name == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket, PaginationConfig, StartAfter=None):
+        page_size = PaginationConfig["PageSize"]
+        remaining = [x for x in self.keys if StartAfter is None or x > StartAfter]
+        for i in range(0, len(remaining), page_size):
+            with self.lock:
+                page = [x for x in remaining[i : i + page_size] if x not in self.deleted]
+            yield {"Contents": [{"Key": x} for x in page]}
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [x["Key"] for x in Delete["Objects"]]
+        assert Delete["Quiet"] and len(keys) <= 1000
+        errors = [
+            {"Key": x, "Code": "AccessDenied", "Message": "Access Denied"}
+            for x in keys
+            if x in self.failing_keys
+        ]
+        with self.lock:
+            self.delete_requests.append(keys)
+            self.deleted.update(x for x in keys if x not in self.failing_keys)
+        return {"Errors": errors} if errors else {}
+
+    def delete_bucket(self, Bucket):
+        if set(self.keys) - self.deleted:
+            raise botocore.exceptions.ClientError(
+                {"Error": {"Code": "BucketNotEmpty", "Message": "The bucket is not empty"}},
+                "DeleteBucket",
+            )
+        self.bucket_deleted = True
+
+
+def s3_connector(client):
+    """Set up a connector using the fake client, without database."""
+    connector = ApiS3Connector(project=types.SimpleNamespace(bucket="dds-test-bucket"))
+    connector.resource = types.SimpleNamespace(meta=types.SimpleNamespace(client=client))
+    connector.url, connector.bucketname = ("https://s3.example.com", "dds-test-bucket")
+    connector.bucket_exists = True
+    return connector
+
+
+# TESTS #################################################################################### TESTS #
+
+
+def test_purge_bucket_deletes_all_objects():
+    """All objects are deleted in batches and the progress is reported in key order."""
+    keys = [f"{i:05d}" for i in range(2500)]
+    client = FakeS3Client(keys=keys)
+    checkpoints = []
+
+    s3_connector(client).purge_bucket(
+        checkpoint=lambda last_key, num_keys: checkpoints.append((last_key, num_keys)),
+        max_workers=4,
+    )
+
+    assert client.deleted == set(keys)
+    assert sorted(len(x) for x in client.delete_requests) == [500, 1000, 1000]
+    assert checkpoints == [("00999", 1000), ("01999", 1000), ("02499", 500)]
+
+
+def test_purge_bucket_resumes_after_failure():
+    """A failed purge raises an error and continues after the last saved key next time."""
+    keys = [f"{i:05d}" for i in range(50)]
+    client = FakeS3Client(keys=keys, failing_keys=["00025"])
+    checkpoints = []
+
+    with pytest.raises(botocore.exceptions.ClientError) as err:
+        s3_connector(client).purge_bucket(
+            checkpoint=lambda last_key, num_keys: checkpoints.append((last_key, num_keys)),
+            max_workers=1,
+            batch_size=10,
+        )
+    assert "00025" in str(err.value)
+    assert checkpoints == [("00009", 10), ("00019", 10)]
+
+    # Continue after the last saved key once the problem is fixed
+    client.failing_keys = set()
+    client.delete_requests = []
+    s3_connector(client).purge_bucket(start_after=checkpoints[-1][0], max_workers=2, batch_size=10)
+
+    assert client.deleted == set(keys)
+    assert all(x > "00019" for batch in client.delete_requests for x in batch)
+
+
+def test_remove_bucket_object_added_before_checkpoint_after_interruption():
+    """Objects uploaded before the checkpoint after an interrupted purge are deleted as well."""
+    keys = [f"{i:05d}" for i in range(50)]
+    client = FakeS3Client(keys=keys, failing_keys=["00025"])
+    checkpoints = []
+
+    with pytest.raises(botocore.exceptions.ClientError):
+        s3_connector(client).purge_bucket(
+            checkpoint=lambda last_key, num_keys: checkpoints.append((last_key, num_keys)),
+            max_workers=1,
+            batch_size=10,
+        )
+    assert checkpoints[-1] == ("00019", 10)
+
+    # Uploaded while interrupted, sorts before the saved key
+    client.upload("00005-new")
+    client.failing_keys = set()
+
+    s3_connector(client).remove_bucket(start_after=checkpoints[-1][0])
+
+    assert client.deleted == set(keys) | {"00005-new"}
+    assert client.bucket_deleted
+
+
+def test_remove_bucket_other_errors_raised():
+    """Errors other than a non-empty bucket are raised without purging again."""
+    client = FakeS3Client(keys=[])
+
+    def delete_bucket(Bucket):
+        raise botocore.exceptions.ClientError(
+            {"Error": {"Code": "AccessDenied", "Message": "Access Denied"}}, "DeleteBucket"
+        )
+
+    client.delete_bucket = delete_bucket
+    with pytest.raises(botocore.exceptions.ClientError) as err:
+        s3_connector(client).remove_bucket()
+    assert "AccessDenied" in str(err.value)
+
+
+def test_bucket_statistics():
+    """The object count and size are read from the Ceph RGW headers, if there are any."""
+    client = boto3_s3_connector(endpoint_url="https://s3.example.com").resource.meta.client
+    with botocore.stub.Stubber(client) as stubber:
+        for headers in [{"x-rgw-object-count": "3", "x-rgw-bytes-used": "1024"}, {}]:
+            stubber.add_response(
+                "head_bucket",
+                {"ResponseMetadata": {"HTTPHeaders": headers}},
+                {"Bucket": "dds-test-bucket"},
+            )
+
+        assert ApiS3Connector.bucket_statistics(client=client, bucket="dds-test-bucket") == (
+            3,
+            1024,
+        )
+        assert ApiS3Connector.bucket_statistics(client=client, bucket="dds-test-bucket") is None
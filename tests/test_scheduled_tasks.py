@@ -0,0 +1,138 @@
+# IMPORTS ################################################################################ IMPORTS #
+
+# Standard library
+import datetime
+
+# Installed
+import pytest
+import sqlalchemy
+
+# Own
+from dds_web import db
+from dds_web import scheduled_tasks
+from dds_web.api import db_tools
+from dds_web.errors import DeletionError
+from dds_web.database import models
+import dds_web.utils
+from tests.test_files_new import project_row
+
+# TESTS #################################################################################### TESTS #
+
+
+def make_available(project, days_left):
+    """Add an Available status to the project, with the deadline relative to now."""
+    now = dds_web.utils.current_time()
+    project.project_statuses.append(
+        models.ProjectStatuses(
+            status="Available",
+            date_created=now,
+            deadline=now + datetime.timedelta(days=days_left),
+        )
+    )
+
+
+def test_set_available_to_expired(client):
+    """Only the available projects with a passed deadline are expired."""
+    due_project = project_row(project_id="public_project_id")
+    not_due_project = project_row(project_id="second_public_project_id")
+    make_available(project=due_project, days_left=-1)
+    make_available(project=not_due_project, days_left=1)
+    db.session.commit()
+
+    assert list(
+        scheduled_tasks.due_project_ids(status="Available", deadline=dds_web.utils.current_time())
+    ) == [due_project.id]
+
+    scheduled_tasks.set_available_to_expired()
+
+    assert project_row(project_id="public_project_id").current_status == "Expired"
+    assert project_row(project_id="second_public_project_id").current_status == "Available"
+    assert project_row(project_id="unused_project_id").current_status == "In Progress"
+
+
+def test_change_due_projects_continues_after_error(client):
+    """A project which fails to change status is reported and the other projects are changed."""
+    failing_project = project_row(project_id="public_project_id")
+    other_project = project_row(project_id="second_public_project_id")
+    make_available(project=failing_project, days_left=-1)
+    make_available(project=other_project, days_left=-1)
+    db.session.commit()
+
+    def expired_status_row(project):
+        if project.public_id == "public_project_id":
+            raise DeletionError(project=project.public_id, message="Bucket could not be deleted")
+        return models.ProjectStatuses(status="Expired", date_created=dds_web.utils.current_time())
+
+    errors = scheduled_tasks.change_due_projects(
+        status="Available", new_status="Expired", get_status_row=expired_status_row
+    )
+
+    [unit_errors] = errors.values()
+    assert list(unit_errors) == ["public_project_id"]
+    assert "Deletion failed." in unit_errors["public_project_id"]
+    assert project_row(project_id="public_project_id").current_status == "Available"
+    assert project_row(project_id="second_public_project_id").current_status == "Expired"
+
+
+def test_rollup_daily_usage(client):
+    """The usage until midnight is rolled up per day and the total usage stays the same."""
+    now = dds_web.utils.current_time()
+    project = project_row(project_id="public_project_id")
+    project.file_versions.extend(
+        [
+            models.Version(size_stored=10**9, time_uploaded=now - datetime.timedelta(days=3)),
+            models.Version(
+                size_stored=10**12,
+                time_uploaded=now - datetime.timedelta(days=5, hours=7),
+                time_deleted=now - datetime.timedelta(days=2),
+            ),
+        ]
+    )
+    db.session.commit()
+
+    # Byte hours of every version until the end of yesterday
+    midnight = datetime.datetime.combine(now.date(), datetime.time())
+    expected = {}
+    for version in models.Version.query.all():
+        end = min(version.time_deleted or midnight, midnight)
+        if version.time_uploaded < end:
+            expected[version.project_id] = expected.get(version.project_id, 0) + (
+                version.size_stored * (end - version.time_uploaded).total_seconds() / (60 * 60)
+            )
+    usage_before = db_tools.project_byte_hours(models.Project.query)
+    db.session.commit()
+
+    scheduled_tasks.rollup_daily_usage()
+
+    rolled_up = {
+        x.project_id: float(x.byte_hours)
+        for x in db.session.query(
+            models.UsageDaily.project_id,
+            sqlalchemy.func.sum(models.UsageDaily.byte_hours).label("byte_hours"),
+        ).group_by(models.UsageDaily.project_id)
+    }
+    assert rolled_up.keys() == expected.keys()
+    for project_id, byte_hours in expected.items():
+        assert rolled_up[project_id] == pytest.approx(byte_hours)
+
+    # The open versions are invoiced until midnight
+    assert all(
+        x.time_invoiced == midnight
+        for x in models.Version.query.filter(
+            sqlalchemy.and_(
+                models.Version.time_deleted.is_(None), models.Version.time_uploaded < midnight
+            )
+        )
+    )
+
+    # Running again does not add anything
+    scheduled_tasks.rollup_daily_usage()
+    assert sum(float(x.byte_hours) for x in models.UsageDaily.query) == pytest.approx(
+        sum(rolled_up.values())
+    )
+
+    # The rollups and the remaining usage give the same total, up to the time that has passed
+    usage_after = db_tools.project_byte_hours(models.Project.query)
+    assert usage_after.keys() == usage_before.keys()
+    for project_id, byte_hours in usage_before.items():
+        assert usage_after[project_id] == pytest.approx(byte_hours, rel=1e-3)
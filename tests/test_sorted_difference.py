@@ -0,0 +1,44 @@
+# IMPORTS ################################################################################ IMPORTS #
+
+# Installed
+import pytest
+
+# Own
+from dds_web.database import models  # dds_web.utils can only be imported after the models
+from dds_web.utils import sorted_difference
+
+# TESTS #################################################################################### TESTS #
+
+
+def test_sorted_difference():
+    """The values only in one of the iterables are returned in order, marked by iterable."""
+    s3_keys = ["a", "b", "d", "f", "g"]
+    db_keys = ["b", "c", "d", "e", "g", "h"]
+
+    assert list(sorted_difference(iter(s3_keys), iter(db_keys))) == [
+        ("a", True),
+        ("c", False),
+        ("e", False),
+        ("f", True),
+        ("h", False),
+    ]
+
+
+def test_sorted_difference_empty():
+    """All values are returned if the other iterable is empty."""
+    assert list(sorted_difference([], [])) == []
+    assert list(sorted_difference(["a", "b"], [])) == [("a", True), ("b", True)]
+    assert list(sorted_difference([], ["a", "b"])) == [("a", False), ("b", False)]
+
+
+def test_sorted_difference_byte_order():
+    """Strings compare like their UTF-8 bytes, the order of S3 listings and BINARY columns."""
+    keys = ["Z", "a", "é", "ü", "€", "😀"]
+    assert [x.encode("utf-8") for x in keys] == sorted(x.encode("utf-8") for x in keys)
+    assert list(sorted_difference(keys, keys[1:])) == [("Z", True)]
+
+
+def test_sorted_difference_not_sorted():
+    """Unsorted input would give wrong differences, so it is an error."""
+    with pytest.raises(ValueError):
+        list(sorted_difference(["b", "a"], ["a", "b"]))
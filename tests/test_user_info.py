@@ -1,12 +1,42 @@
 # Installed
+import datetime
 import http
 import unittest
+import pytest
 
 # Own
+import dds_web.utils
 import tests
+from dds_web import db
+from dds_web.database import models
+from tests.test_files_new import project_row
 from tests.test_user_delete import user_from_email
 
 
+def add_deleted_file_versions(project_id):
+    """Add versions of deleted files, 12.5 TB hours in total, to the project."""
+    project = project_row(project_id=project_id)
+    start = datetime.datetime(2022, 1, 1)
+    for size, hours in [(10**12, 10), (10**12, 2.5)]:
+        project.file_versions.append(
+            models.Version(
+                size_stored=size,
+                time_uploaded=start,
+                time_deleted=start + datetime.timedelta(hours=hours),
+            )
+        )
+    db.session.commit()
+
+
+def expected_byte_hours(project_id):
+    """Calculate the byte hours of all versions of the project."""
+    now = dds_web.utils.current_time()
+    return sum(
+        x.size_stored * ((x.time_deleted or now) - x.time_uploaded).total_seconds() / (60 * 60)
+        for x in models.Version.query.filter_by(project_id=project_row(project_id=project_id).id)
+    )
+
+
 def test_get_info_unit_user(client):
     """Get info for unit user/Unit Admin"""
 
@@ -98,3 +128,28 @@ def test_show_usage_unit_user(client):
     case.assertCountEqual(
         [x.public_id for x in unit_user.projects], response.json["project_usage"].keys()
     )
+
+
+def test_show_usage_values(client):
+    """The usage is the exact byte hours of all versions, also of deleted files."""
+    add_deleted_file_versions(project_id="file_testing_project")
+    public_project_gbhours = expected_byte_hours(project_id="public_project_id") / 1e9
+
+    response = client.get(
+        tests.DDSEndpoint.USAGE,
+        headers=tests.UserAuth(tests.USER_CREDENTIALS["unituser"]).token(client),
+        content_type="application/json",
+    )
+    assert response.status_code == http.HTTPStatus.OK
+
+    # 12.5 TB hours at 0.09 kr per GB and 30 day month
+    assert response.json["project_usage"]["file_testing_project"] == {
+        "gbhours": 12500.0,
+        "cost": 1.56,
+    }
+    assert response.json["project_usage"]["public_project_id"]["gbhours"] == pytest.approx(
+        round(public_project_gbhours, 2), abs=0.01
+    )
+    assert response.json["total_usage"]["gbhours"] == pytest.approx(
+        12500 + public_project_gbhours, abs=0.01
+    )